@@ -0,0 +1,211 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# asyncio front end of the capture -> detect -> hand data -> render loop
+# every blocking opencv / mediapipe call runs on a bounded executor, the event loop only awaits results
+
+# frames() yields (frame, landmarks, hand_state)
+# frame: BGR frame, rendered onto when a renderer is given, its buffer is reused after the next iteration
+# landmarks: (hands, 21, 3) copy of HandDetect.get_details, empty without a detector or detection
+# hand_state: (active_bits, directions_bits) of hand_data after this frame, None when nothing was detected
+class AsyncFrameSource:
+    def __init__(self, camera, hand_detector = None, hand_data = None, renderer = None,
+        executor = None, max_pending : int = 2, code = cv2.COLOR_BGR2RGB):
+
+        # stream objects
+        self.__camera = camera
+        self.__hand_detector = hand_detector
+        self.__hand_data = hand_data
+        self.__renderer = renderer
+        self.__code = code
+
+        # one step at a time, the detector and hand data keep state between frames
+        self.__owns_executor = executor is None
+        self.__executor = executor if executor is not None else concurrent.futures.ThreadPoolExecutor(1)
+        self.__step_lock = threading.Lock()
+        self.__max_pending = max_pending
+
+        # frames are captured into a fixed ring, allocated from the first frame
+        self.__buffers = None
+        self.__buffer_index = 0
+        self.__empty_landmarks = np.zeros((0, 21, 3), dtype = np.float64)
+        self.__empty_landmarks.flags.writeable = False
+
+        self.__frame_count = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def __aiter__(self):
+        return self.frames()
+
+    @property
+    def frame_count(self):
+        return self.__frame_count
+
+    # capture, detection, hand data and rendering of one frame, runs on the executor
+    def __step(self):
+        with self.__step_lock:
+            if self.__buffers is None:
+                if not self.__camera.capture(): return None
+                first = self.__camera.frame()
+                self.__buffers = [np.empty_like(first) for _ in range(self.__max_pending + 3)]
+                frame = self.__buffers[0]
+                frame[...] = first
+            else:
+                frame = self.__buffers[self.__buffer_index]
+                if not self.__camera.capture_into(frame): return None
+            self.__buffer_index = (self.__buffer_index + 1) % len(self.__buffers)
+            timestamp = time.perf_counter()
+
+            if self.__hand_detector is None or not self.__hand_detector.detect(frame, self.__code):
+                return frame, self.__empty_landmarks, None
+            landmarks = self.__hand_detector.get_details.copy()
+
+            hand_state = None
+            if self.__hand_data is not None:
+                self.__hand_data.update(landmarks, timestamp = timestamp)
+                hand_state = (self.__hand_data.active_bits, self.__hand_data.directions_bits)
+
+            if self.__renderer is not None:
+                self.__hand_detector.render(frame, render_fn_labels = self.__renderer.render_cv2_labels,
+                    render_fn_skeleton = self.__renderer.render_skeleton)
+            return frame, landmarks, hand_state
+
+    # keeps at most max_pending finished frames ahead of the consumer, capture waits while the queue is full
+    async def __produce(self, frames : asyncio.Queue):
+        try:
+            while True:
+                item = await asyncio.wrap_future(self.__executor.submit(self.__step))
+                if item is None: break
+                await frames.put(item)
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            await frames.put(error)
+            return
+        await frames.put(None)
+
+    # async generator of (frame, landmarks, hand_state), ends when the camera stops delivering frames
+    # capturing stops when the generator is closed, wrap it in contextlib.aclosing to do that on break
+    async def frames(self):
+        frames = asyncio.Queue(self.__max_pending)
+        producer = asyncio.get_running_loop().create_task(self.__produce(frames))
+        try:
+            while True:
+                item = await frames.get()
+                if item is None: break
+                if isinstance(item, Exception): raise item
+                self.__frame_count += 1
+                yield item
+        finally:
+            producer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await producer
+
+    # waits for a step still running on an owned executor without blocking the loop
+    async def close(self):
+        if self.__owns_executor:
+            await asyncio.get_running_loop().run_in_executor(None, self.__executor.shutdown)
+
+# consumer of rendered frames or overlays, write_fn(image) runs on the executor in send order
+# send() waits while max_pending images are queued, or with drop = True replaces the oldest one
+class AsyncFrameSink:
+    def __init__(self, write_fn, executor = None, max_pending : int = 2, drop : bool = False):
+
+        # sink details
+        self.__write_fn = write_fn
+        self.__owns_executor = executor is None
+        self.__executor = executor if executor is not None else concurrent.futures.ThreadPoolExecutor(1)
+        self.__drop = drop
+        self.__images = asyncio.Queue(max_pending)
+        self.__writer = None
+        self.__error = None
+
+        self.__written = 0
+        self.__dropped = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    @property
+    def written(self):
+        return self.__written
+
+    @property
+    def dropped(self):
+        return self.__dropped
+
+    async def __write(self):
+        while True:
+            image = await self.__images.get()
+            if image is None: break
+            try:
+                await asyncio.wrap_future(self.__executor.submit(self.__write_fn, image))
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                self.__error = error
+                break
+            self.__written += 1
+
+    # the caller must not modify image until it was written, e.g. pass a copy of a reused buffer
+    async def send(self, image):
+        if self.__error is not None: raise self.__error
+        if self.__writer is None:
+            self.__writer = asyncio.get_running_loop().create_task(self.__write())
+
+        if self.__drop and self.__images.full():
+            self.__images.get_nowait()
+            self.__dropped += 1
+        await self.__images.put(image)
+
+    # writes what is still queued, then stops the writer
+    async def close(self):
+        if self.__writer is not None:
+            if not self.__writer.done():
+                await self.__images.put(None)
+            await self.__writer
+            self.__writer = None
+        if self.__owns_executor:
+            await asyncio.get_running_loop().run_in_executor(None, self.__executor.shutdown)
+        if self.__error is not None: raise self.__error
+
+if __name__ == "__main__":
+    import Camera as cam
+    import HandData as hdata
+    import HandDetect as hd
+    import Renderer as rdr
+
+    async def main():
+        camera_object = cam.Camera(camera_index = 1)
+        source = AsyncFrameSource(camera_object, hd.HandDetect(max_num_hands = 1, warm_up = True),
+            hdata.HandData(), rdr.Renderer())
+
+        # window calls stay on the sink thread, escape stops the stream
+        stop = threading.Event()
+        def show(image):
+            cv2.imshow("Async Output", image)
+            if cv2.waitKey(1) & 0xFF == 27: stop.set()
+
+        # the sink may still hold a frame when the source reuses its buffer, so it gets a copy
+        async with source, AsyncFrameSink(show, drop = True) as sink, contextlib.aclosing(source.frames()) as frames:
+            async for frame, landmarks, hand_state in frames:
+                if hand_state is not None: print(len(landmarks), hand_state)
+                await sink.send(frame.copy())
+                if stop.is_set(): break
+        cv2.destroyAllWindows()
+
+    asyncio.run(main())
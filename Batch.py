@@ -0,0 +1,145 @@
+import argparse
+import multiprocessing
+import os
+
+import cv2
+import numpy as np
+
+import HandData as hdata
+import HandDetect as hd
+
+IMAGE_EXTENSIONS = (".bmp", ".jpeg", ".jpg", ".png", ".tif", ".tiff", ".webp")
+
+# frames of a video file or of a directory of images (sorted by name), read by index range
+class FrameSource:
+    def __init__(self, path : str):
+        self.__path = path
+        self.__images = None
+
+        if os.path.isdir(path):
+            self.__images = sorted(os.path.join(path, name) for name in os.listdir(path)
+                if name.lower().endswith(IMAGE_EXTENSIONS))
+            self.__frame_count = len(self.__images)
+            return
+
+        capture_object = cv2.VideoCapture(path)
+        if not capture_object.isOpened():
+            raise FileNotFoundError("cannot open video %s" % path)
+        self.__frame_count = int(capture_object.get(cv2.CAP_PROP_FRAME_COUNT))
+        capture_object.release()
+
+    def __len__(self):
+        return self.__frame_count
+
+    @property
+    def path(self):
+        return self.__path
+
+    # yields (index, bgr frame) for start <= index < stop, stops early at the end of the video
+    def read(self, start : int, stop : int):
+        if self.__images is not None:
+            for index in range(start, min(stop, self.__frame_count)):
+                frame = cv2.imread(self.__images[index])
+                if frame is not None:
+                    yield index, frame
+            return
+
+        capture_object = cv2.VideoCapture(self.__path)
+        capture_object.set(cv2.CAP_PROP_POS_FRAMES, start)
+        frame = None
+        for index in range(start, stop):
+            retval, frame = capture_object.read(frame)
+            if not retval: break
+            yield index, frame
+        capture_object.release()
+
+# columns written per detected hand, one row each
+COLUMNS = {
+    "frame"      : ((), np.int64),
+    "hand"       : ((), np.int8),
+    "landmarks"  : ((hd.HAND_LANDMARKS, 3), np.float32),
+    "handedness" : ((), np.int8),
+    "score"      : ((), np.float32),
+    "active"     : ((len(hdata.HandIndices),), bool),
+    "directions" : ((len(hdata.Directions),), bool) }
+
+def empty_columns(rows : int = 0):
+    return { name : np.zeros((rows,) + shape, dtype = dtype) for name, (shape, dtype) in COLUMNS.items() }
+
+# one HandDetect per worker process, created by the pool initializer
+_hand_detector = None
+
+def _init_worker(detector_kwargs):
+    global _hand_detector
+    _hand_detector = hd.HandDetect(**detector_kwargs)
+
+# chunk: (path, start, stop, warmup, tracker_kwargs)
+# the warmup frames before start are processed and discarded so tracking starts settled
+def _process_chunk(chunk):
+    path, start, stop, warmup, tracker_kwargs = chunk
+    hand_tracker = hdata.HandTracker(_hand_detector.max_num_hands, **tracker_kwargs)
+    rows = { name : [] for name in COLUMNS }
+    frame_rgb = None
+
+    for index, frame in FrameSource(path).read(max(0, start - warmup), stop):
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB,
+            dst = frame_rgb if frame_rgb is not None and frame_rgb.shape == frame.shape else None)
+        height, width = frame.shape[:2]
+        hand_count = _hand_detector.hand_count if _hand_detector(frame_rgb, height, width) else 0
+        details = _hand_detector.get_details[:hand_count]
+        handedness = _hand_detector.get_handedness[:hand_count]
+        hand_tracker.update(details, handedness)
+        if index < start or not hand_count: continue
+
+        # flags of the tracker slot each detection was matched to, none when unmatched
+        slots = hand_tracker.assignment
+        matched = (slots >= 0)[:, None]
+        rows["frame"].append(np.full(hand_count, index))
+        rows["hand"].append(np.arange(hand_count))
+        rows["landmarks"].append(details.copy())
+        rows["handedness"].append(handedness.copy())
+        rows["score"].append(_hand_detector.get_scores[:hand_count].copy())
+        rows["active"].append(hand_tracker.active_mask[slots] & matched)
+        rows["directions"].append(hand_tracker.directions_mask[slots] & matched)
+
+    if not rows["frame"]:
+        return empty_columns()
+    return { name : np.concatenate(rows[name]).astype(COLUMNS[name][1], copy = False) for name in COLUMNS }
+
+# runs HandDetect and HandTracker over a video file or image directory with a process pool
+# returns the columns (also saved to output_path as .npz when given), rows ordered by frame then hand
+def process_batch(path : str, output_path : str = None,
+    processes : int = None,
+    chunk_size : int = 256,
+    warmup : int = 8,
+    detector_kwargs : dict = None,
+    tracker_kwargs : dict = None):
+
+    frame_count = len(FrameSource(path))
+    chunks = [(path, start, min(start + chunk_size, frame_count), warmup, tracker_kwargs or {})
+        for start in range(0, frame_count, chunk_size)]
+
+    # spawn keeps mediapipe out of forked parents
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes, _init_worker, (detector_kwargs or {},)) as pool:
+        results = pool.map(_process_chunk, chunks, chunksize = 1)
+
+    columns = empty_columns() if not results else {
+        name : np.concatenate([result[name] for result in results]) for name in COLUMNS }
+    if output_path is not None:
+        np.savez(output_path, frame_count = frame_count, **columns)
+    return columns
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Detect hands in a video file or image directory")
+    parser.add_argument("input", help = "video file or directory of images")
+    parser.add_argument("output", help = "output .npz file")
+    parser.add_argument("--processes", type = int, default = None)
+    parser.add_argument("--chunk-size", type = int, default = 256)
+    parser.add_argument("--warmup", type = int, default = 8)
+    parser.add_argument("--max-num-hands", type = int, default = 2)
+    args = parser.parse_args()
+
+    columns = process_batch(args.input, args.output, args.processes, args.chunk_size, args.warmup,
+        { "max_num_hands" : args.max_num_hands })
+    print("%d hands in %d frames" % (len(columns["frame"]), len(np.unique(columns["frame"]))))
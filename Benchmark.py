@@ -0,0 +1,362 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+# headless benchmarks of every stage on fixed inputs
+# each case is a setup function returning the callable to time, cases that cannot run here are skipped
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+FRAME_SIZE = (1280, 720)
+SEED = 0
+
+# latency percentiles (ms), throughput (calls/s) and peak traced memory (bytes) of function
+def measure(function, iterations : int = 200, warmup : int = 10, memory_iterations : int = 5):
+    for _ in range(warmup):
+        function()
+
+    samples = np.empty(iterations, dtype = float)
+    start = time.perf_counter()
+    for index in range(iterations):
+        call_start = time.perf_counter()
+        function()
+        samples[index] = time.perf_counter() - call_start
+    elapsed = time.perf_counter() - start
+
+    # memory is traced in a separate pass so tracing does not slow the timed calls
+    tracemalloc.start()
+    for _ in range(memory_iterations):
+        function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    samples *= 1000.0
+    return {
+        "iterations"  : iterations,
+        "mean_ms"     : float(samples.mean()),
+        "p50_ms"      : float(np.percentile(samples, 50)),
+        "p90_ms"      : float(np.percentile(samples, 90)),
+        "p99_ms"      : float(np.percentile(samples, 99)),
+        "max_ms"      : float(samples.max()),
+        "throughput"  : iterations / elapsed if elapsed > 0 else 0.0,
+        "peak_memory" : int(peak) }
+
+# cold start of a fresh interpreter running statement in the repository directory, repeats times
+# also reports which of the heavy modules the statement loaded
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+exec(sys.argv[1])
+elapsed = time.perf_counter() - start
+print(json.dumps({ "seconds" : elapsed, "heavy" : [name for name in sys.argv[2:] if name in sys.modules] }))
+"""
+HEAVY_MODULES = ("matplotlib", "mpl_toolkits", "mediapipe", "scipy")
+
+def measure_startup(statement : str, repeats : int = 5):
+    samples, process_samples, heavy = np.empty(repeats, dtype = float), np.empty(repeats, dtype = float), set()
+    for index in range(repeats):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, statement] + list(HEAVY_MODULES),
+            cwd = DIRECTORY, capture_output = True, text = True, check = True).stdout
+        process_samples[index] = time.perf_counter() - start
+        result = json.loads(output.strip().splitlines()[-1])
+        samples[index] = result["seconds"]
+        heavy.update(result["heavy"])
+
+    samples *= 1000.0
+    return {
+        "iterations"    : repeats,
+        "mean_ms"       : float(samples.mean()),
+        "p50_ms"        : float(np.percentile(samples, 50)),
+        "p90_ms"        : float(np.percentile(samples, 90)),
+        "p99_ms"        : float(np.percentile(samples, 99)),
+        "max_ms"        : float(samples.max()),
+        "process_ms"    : float(np.median(process_samples)) * 1000.0,
+        "heavy_modules" : sorted(heavy) }
+
+# fixed inputs
+
+def synthetic_frame(size = FRAME_SIZE, seed : int = SEED):
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (size[1] // 16, size[0] // 16, 3), dtype = np.uint8)
+    return cv2.resize(small, size, interpolation = cv2.INTER_LINEAR)
+
+def bundled_frame(name : str, size = FRAME_SIZE):
+    image = cv2.imread(os.path.join(DIRECTORY, name))
+    if image is None:
+        raise FileNotFoundError(name)
+    return cv2.resize(image, size, interpolation = cv2.INTER_AREA)
+
+# (frames, 1, 21, 3) pixel landmarks of a hand drifting across the frame, or those of a recording
+def landmark_frames(recording : str = None, frame_count : int = 300, seed : int = SEED):
+    if recording is not None:
+        import Recording as rc
+        replay = rc.LandmarkReplay(recording)
+        frames = [details[:1] for _, details, _, _ in replay if len(details)]
+        if frames:
+            return np.array(frames, dtype = np.float64)
+
+    rng = np.random.default_rng(seed)
+    base = rng.uniform((200.0, 150.0, -0.05), (300.0, 250.0, 0.05), (21, 3))
+    drift = np.cumsum(rng.normal(0.0, (4.0, 4.0, 0.002), (frame_count, 3)), axis = 0)
+    return (base + drift[:, None, :])[:, None]
+
+# directory: temporary directory of the run, removed with it
+def synthetic_video(directory : str, size = FRAME_SIZE, frame_count : int = 4):
+    path = os.path.join(directory, "benchmark_%dx%d_%d.avi" % (size[0], size[1], frame_count))
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, size)
+    for index in range(frame_count):
+        writer.write(synthetic_frame(size, SEED + index))
+    writer.release()
+    return path
+
+# iterates the frames forever so the timed callables can run any number of times
+def cycle(frames):
+    while True:
+        for frame in frames:
+            yield frame
+
+# benchmark cases
+
+def camera_case(size = None):
+    import Camera as cam
+
+    def setup(options):
+        camera_object = cam.Camera(synthetic_video(options.directory), window_name = None)
+        if not camera_object.capture():
+            raise RuntimeError("cannot read the synthetic video")
+        return lambda: camera_object.convert_image(cv2.COLOR_BGR2RGB, size)
+    return setup
+
+def hand_detect_case(options):
+    import HandDetect as hd
+    hand_detector = hd.HandDetect()
+    frames = [cv2.cvtColor(bundled_frame(name), cv2.COLOR_BGR2RGB) for name in ("hand_reference.png", "solid_image.jpg")]
+    frames = cycle(frames)
+    return lambda: hand_detector(next(frames), FRAME_SIZE[1], FRAME_SIZE[0])
+
+def hand_data_case(options):
+    import HandData as hdata
+    hand_data = hdata.HandData()
+    frames = cycle(landmark_frames(options.landmarks))
+    return lambda: hand_data.update(next(frames))
+
+def hand_tracker_case(options):
+    import HandData as hdata
+    hand_tracker = hdata.HandTracker()
+    frames = cycle(landmark_frames(options.landmarks))
+    return lambda: hand_tracker.update(next(frames))
+
+# rotated every call so each render draws a new frame instead of returning the cached image
+def graph_case(graph_type, backend):
+    def setup(options):
+        import matplotlib
+        matplotlib.use("Agg")
+        import Graph as gr
+        graph = gr.Graph(graph_type = gr.GraphType[graph_type], backend = gr.GraphBackend[backend])
+        image = graph.render_to_image()
+        angles = cycle(np.linspace(0.0, 2.0 * np.pi, 90, endpoint = False))
+
+        def render():
+            graph.rotate(np.array([0.0, 0.0, 1.0]), next(angles))
+            graph.render_to_image(out = image)
+        return render
+    return setup
+
+def hand_landmarks(details, width : int, height : int):
+    from mediapipe.framework.formats import landmark_pb2
+    landmarks = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z in details:
+        landmarks.landmark.add(x = x / width, y = y / height, z = z)
+    return landmarks
+
+def renderer_case(method):
+    def setup(options):
+        import HandDetect as hd
+        import Renderer as rdr
+        renderer = rdr.Renderer()
+        frame = synthetic_frame()
+        details = landmark_frames(options.landmarks)[0]
+        connections = hd.HAND_CONNECTIONS
+
+        # only the mediapipe drawing path needs mediapipe, the other cases run without it
+        if method == "render_mp":
+            landmarks = hand_landmarks(details[0], FRAME_SIZE[0], FRAME_SIZE[1])
+            return lambda: renderer.render_mp(frame, landmarks, connections)
+        if method == "render_cv2":
+            positions = details[0, :, :2].astype(int) + 10
+            return lambda: [renderer.render_cv2(frame, str(landmark_id), (int(x), int(y)))
+                for landmark_id, (x, y) in enumerate(positions)]
+        if method == "render_cv2_labels":
+            positions = details[0, :, :2].astype(int) + 10
+            return lambda: renderer.render_cv2_labels(frame, positions)
+        if method == "render_skeleton":
+            return lambda: renderer.render_skeleton(frame, details, connections)
+        if method == "composite":
+            overlay = np.zeros((480, 640, 4), dtype = np.uint8)
+            overlay[120:360, 160:480] = (40, 120, 200, 160)
+            return lambda: renderer.composite(frame, overlay)
+        raise ValueError(method)
+    return setup
+
+# frame -> rgb -> detection -> HandData -> drawing -> graph overlay, as the demos run it
+def end_to_end_case(options):
+    import matplotlib
+    matplotlib.use("Agg")
+    import Graph as gr
+    import HandData as hdata
+    import HandDetect as hd
+    import Renderer as rdr
+
+    hand_detector = hd.HandDetect()
+    hand_data = hdata.HandData()
+    renderer = rdr.Renderer()
+    graph = gr.Graph(graph_type = gr.GraphType.SURFACE, backend = gr.GraphBackend.OPENCV)
+    graph_image = graph.render_to_image()
+    source = cycle([bundled_frame("hand_reference.png"), bundled_frame("solid_image.jpg")])
+    frame_rgb = np.empty((FRAME_SIZE[1], FRAME_SIZE[0], 3), dtype = np.uint8)
+    angles = cycle(np.linspace(0.0, 2.0 * np.pi, 90, endpoint = False))
+
+    def loop():
+        frame = next(source).copy()
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst = frame_rgb)
+        if hand_detector(frame_rgb, FRAME_SIZE[1], FRAME_SIZE[0]):
+            hand_data.update(hand_detector.get_details)
+            hand_detector.render(frame, render_fn_labels = renderer.render_cv2_labels,
+                render_fn_skeleton = renderer.render_skeleton)
+        graph.rotate(np.array([0.0, 0.0, 1.0]), next(angles))
+        graph.render_to_image(out = graph_image)
+        renderer.composite(frame, graph_image)
+    return loop
+
+# import time and construction cost of the entry points, the light modules must not load any HEAVY_MODULES
+STARTUP_CASES = {
+    "startup.import.HandData"   : "import HandData",
+    "startup.import.Transform"  : "import Transform",
+    "startup.import.Filters"    : "import Filters",
+    "startup.import.Graph"      : "import Graph",
+    "startup.import.HandDetect" : "import HandDetect",
+    "startup.import.Renderer"   : "import Renderer",
+    "startup.graph.opencv"      : "import Graph; Graph.Graph(graph_type = Graph.GraphType.SURFACE, backend = Graph.GraphBackend.OPENCV).render_to_image()",
+    "startup.hand_detect"       : "import HandDetect; HandDetect.HandDetect()",
+    "startup.hand_detect.first" : "import numpy, HandDetect; HandDetect.HandDetect()(numpy.zeros((720, 1280, 3), numpy.uint8), 720, 1280)" }
+
+CASES = {
+    "camera.convert_image"            : camera_case(),
+    "camera.convert_image.half"       : camera_case((FRAME_SIZE[0] // 2, FRAME_SIZE[1] // 2)),
+    "hand_detect.call"                : hand_detect_case,
+    "hand_data.update"                : hand_data_case,
+    "hand_tracker.update"             : hand_tracker_case,
+    "renderer.render_mp"              : renderer_case("render_mp"),
+    "renderer.render_cv2"             : renderer_case("render_cv2"),
+    "renderer.render_cv2_labels"      : renderer_case("render_cv2_labels"),
+    "renderer.render_skeleton"        : renderer_case("render_skeleton"),
+    "renderer.composite"              : renderer_case("composite"),
+    "end_to_end"                      : end_to_end_case }
+for graph_type in ("LINE", "WIREFRAME", "SURFACE", "CONTOUR"):
+    for backend in ("MATPLOTLIB", "OPENCV"):
+        CASES["graph.render_to_image.%s.%s" % (graph_type.lower(), backend.lower())] = graph_case(graph_type, backend)
+
+def run(options):
+    with tempfile.TemporaryDirectory() as directory:
+        options.directory = directory
+        return run_cases(options)
+
+def run_cases(options):
+    results = {}
+    for name, statement in STARTUP_CASES.items():
+        if options.filter and not any(pattern in name for pattern in options.filter): continue
+        try:
+            results[name] = measure_startup(statement, options.startup_repeats)
+        except subprocess.CalledProcessError as error:
+            results[name] = { "skipped" : error.stderr.strip().splitlines()[-1] if error.stderr.strip() else str(error) }
+
+    for name, setup in CASES.items():
+        if options.filter and not any(pattern in name for pattern in options.filter): continue
+        # a case failing in setup or while it runs is reported as skipped, compare() flags it against a baseline
+        try:
+            results[name] = measure(setup(options), options.iterations, options.warmup)
+        except Exception as error:
+            results[name] = { "skipped" : "%s: %s" % (type(error).__name__, error) }
+
+    return {
+        "meta" : {
+            "time"     : time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "platform" : platform.platform(),
+            "python"   : platform.python_version(),
+            "numpy"    : np.__version__,
+            "cv2"      : cv2.__version__,
+            "cpu_count": os.cpu_count() },
+        "results" : results }
+
+# cases whose metric grew by more than tolerance (fraction) against the baseline,
+# that load heavy modules the baseline did not, or that ran in the baseline and are skipped now
+def compare(report, baseline, tolerance : float = 0.1, metric : str = "p50_ms"):
+    regressions = {}
+    for name, result in report["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None or metric not in previous: continue
+        if "skipped" in result:
+            regressions[name] = { "baseline" : previous[metric], "current" : None, "skipped" : result["skipped"] }
+            continue
+        if metric not in result: continue
+        imported = sorted(set(result.get("heavy_modules", [])) - set(previous.get("heavy_modules", [])))
+        if imported:
+            regressions[name] = { "baseline" : previous[metric], "current" : result[metric],
+                "change" : result[metric] / previous[metric] - 1.0 if previous[metric] > 0 else 0.0, "imported" : imported }
+            continue
+        if previous[metric] > 0 and result[metric] > previous[metric] * (1.0 + tolerance):
+            regressions[name] = { "baseline" : previous[metric], "current" : result[metric],
+                "change" : result[metric] / previous[metric] - 1.0 }
+    return regressions
+
+def print_report(report, regressions):
+    for name, result in report["results"].items():
+        if "skipped" in result:
+            print("%-40s skipped (%s)%s" % (name, result["skipped"],
+                "  REGRESSION ran in the baseline" if name in regressions else ""))
+            continue
+        regression = ""
+        if name in regressions:
+            regression = "  REGRESSION %+.1f%%" % (regressions[name]["change"] * 100.0)
+            if "imported" in regressions[name]:
+                regression += " imports %s" % ", ".join(regressions[name]["imported"])
+        if "heavy_modules" in result:
+            print("%-40s p50 %8.3f ms  p99 %8.3f ms  process %8.1f ms  loads %s%s" % (name, result["p50_ms"],
+                result["p99_ms"], result["process_ms"], ", ".join(result["heavy_modules"]) or "-", regression))
+            continue
+        print("%-40s p50 %8.3f ms  p99 %8.3f ms  %9.1f /s  %10d B%s" % (name, result["p50_ms"],
+            result["p99_ms"], result["throughput"], result["peak_memory"], regression))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark every stage of the AR pipeline")
+    parser.add_argument("--output", help = "write the results to this json file")
+    parser.add_argument("--baseline", help = "json results to compare against")
+    parser.add_argument("--tolerance", type = float, default = 0.1, help = "allowed p50 slowdown, fraction")
+    parser.add_argument("--iterations", type = int, default = 200)
+    parser.add_argument("--warmup", type = int, default = 10)
+    parser.add_argument("--startup-repeats", type = int, default = 5, help = "fresh interpreters per startup case")
+    parser.add_argument("--filter", nargs = "*", help = "only run cases containing one of these names")
+    parser.add_argument("--landmarks", help = "landmark recording to use instead of synthetic landmarks")
+    options = parser.parse_args()
+
+    report = run(options)
+    regressions = {}
+    if options.baseline:
+        with open(options.baseline) as file:
+            regressions = compare(report, json.load(file), options.tolerance)
+        report["regressions"] = regressions
+    print_report(report, regressions)
+
+    if options.output:
+        with open(options.output, "w") as file:
+            json.dump(report, file, indent = 2)
+    raise SystemExit(1 if regressions else 0)
@@ -1,33 +1,315 @@
 
+from enum import Enum
 import cv2
 import numpy as np
+import threading
+
+# pixel layout of captured frames, YUYV skips the backend conversion to BGR where supported
+class FrameFormat(Enum):
+    BGR  = 0
+    YUYV = 1
+
+# conversion from each frame format to the rgb image mediapipe expects
+RGB_CODES = {
+    FrameFormat.BGR  : cv2.COLOR_BGR2RGB,
+    FrameFormat.YUYV : cv2.COLOR_YUV2RGB_YUYV }
+
+# fourcc a capture has to report before its raw frames are read as YUYV
+YUYV_FOURCC = cv2.VideoWriter_fourcc(*"YUYV")
+
+# fixed ring of preallocated frame buffers, filled by a capture thread
+# slots are reused, the oldest undelivered frame is overwritten when full
+class FrameRing:
+    def __init__(self, shape, buffer_count : int = 3, dtype = np.uint8):
+
+        # writer needs a free slot while the reader holds one
+        if buffer_count < 2:
+            raise ValueError("FrameRing requires at least 2 buffers")
+
+        # buffer details
+        self.__buffers = np.zeros((buffer_count,) + tuple(shape), dtype = dtype)
+        self.__sequence = np.full(buffer_count, -1, dtype = np.int64)
+        self.__held = -1
+
+        # counters
+        self.__write_sequence = 0
+        self.__read_sequence = -1
+        self.__dropped = 0
+        self.__duplicated = 0
+
+        self.__closed = False
+        self.__condition = threading.Condition()
+
+    @property
+    def buffer_count(self):
+        return len(self.__buffers)
+
+    @property
+    def shape(self):
+        return self.__buffers.shape[1:]
+
+    @property
+    def dropped(self):
+        return self.__dropped
+
+    @property
+    def duplicated(self):
+        return self.__duplicated
+
+    @property
+    def closed(self):
+        return self.__closed
+
+    # writer side: returns (slot index, buffer) to be filled outside the lock
+    def acquire(self):
+        with self.__condition:
+            candidates = [i for i in range(len(self.__buffers)) if i != self.__held]
+            index = min(candidates, key = lambda i: self.__sequence[i])
+            self.__sequence[index] = -1
+            return index, self.__buffers[index]
+
+    def commit(self, index : int):
+        with self.__condition:
+            self.__sequence[index] = self.__write_sequence
+            self.__write_sequence += 1
+            self.__condition.notify_all()
+
+    def close(self):
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+    # reader side: returned view stays valid until the next latest()/next() call
+    def __deliver(self, index : int):
+        sequence = int(self.__sequence[index])
+        if sequence == self.__read_sequence:
+            self.__duplicated += 1
+        elif sequence > self.__read_sequence:
+            self.__dropped += sequence - self.__read_sequence - 1
+            self.__read_sequence = sequence
+        self.__held = index
+        return self.__buffers[index]
+
+    def latest(self):
+        with self.__condition:
+            index = int(np.argmax(self.__sequence))
+            if self.__sequence[index] < 0:
+                return None
+            return self.__deliver(index)
+
+    def next(self, timeout : float = None):
+        with self.__condition:
+            pending = lambda: np.flatnonzero(self.__sequence > self.__read_sequence)
+            if not self.__condition.wait_for(lambda: len(pending()) or self.__closed, timeout):
+                return None
+            indices = pending()
+            if not len(indices):
+                return None
+            return self.__deliver(int(indices[np.argmin(self.__sequence[indices])]))
 
 class Camera:
-    def __init__(self, camera_index : int = 0, window_name : str = "Frame"):
+    def __init__(self, camera_index : int = 0, window_name : str = "Frame",
+        frame_format : FrameFormat = FrameFormat.BGR):
 
-        # capture details
-        self.__capture_object = cv2.VideoCapture(camera_index, cv2.CAP_DSHOW)
+        # capture details, camera_index can also be a video file path
+        # window_name None runs headless
+        if isinstance(camera_index, str):
+            self.__capture_object = cv2.VideoCapture(camera_index)
+        else:
+            self.__capture_object = cv2.VideoCapture(camera_index, cv2.CAP_DSHOW)
         self.__window_name = window_name
-        cv2.namedWindow(window_name)
+        if window_name:
+            cv2.namedWindow(window_name)
         self.__frame = np.zeros(())
 
         self.__image_height = 0
         self.__image_width = 0
 
+        # background capture details
+        self.__frame_ring = None
+        self.__capture_thread = None
+        self.__capturing = False
+
+        # conversion outputs reused every frame, keyed by (code, size)
+        self.__conversion_buffers = {}
+        self.__resize_buffers = {}
+
+        self.__frame_format = FrameFormat.BGR
+        self.request_format(frame_format)
+
     def __del__(self):
+        self.stop_capture()
         if self.__window_name:
             cv2.destroyWindow(self.__window_name)
 
     def capture(self) -> bool:
 
-        retval, self.__frame = self.__capture_object.read()
-        if retval:
-            self.__image_height, self.__image_width, _ = self.__frame.shape
-        return retval
+        # background mode, take the most recent frame without blocking on the sensor
+        if self.__frame_ring is not None:
+            return self.latest_frame()
+
+        retval, frame = self.__read()
+        return retval and self.__set_frame(frame)
+
+    # capture() into buffer, e.g. a SharedFramePool slot, which becomes frame()
+    def capture_into(self, buffer) -> bool:
+
+        if self.__frame_ring is not None:
+            if not self.latest_frame() or self.__frame.shape != buffer.shape: return False
+            buffer[...] = self.__frame
+            return self.__set_frame(buffer)
+
+        # read straight into buffer, copy only if the backend reallocated
+        retval, frame = self.__read(buffer)
+        if not retval or frame.shape != buffer.shape: return False
+        if not np.shares_memory(frame, buffer):
+            buffer[...] = frame
+        return self.__set_frame(buffer)
+
+    # raw frames come back flat from some backends, give them their (height, width, 2) shape
+    # a raw frame of any other size (e.g. a compressed buffer) is reported as a failed read
+    def __read(self, buffer = None):
+        retval, frame = self.__capture_object.read(buffer)
+        if retval and self.__frame_format == FrameFormat.YUYV:
+            height = int(self.__capture_object.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            width = int(self.__capture_object.get(cv2.CAP_PROP_FRAME_WIDTH))
+            if frame.size != height * width * 2:
+                return False, None
+            if frame.ndim != 3:
+                frame = frame.reshape((height, width, 2))
+        return retval, frame
+
+    # asks the backend for another frame format, returns the format actually delivered
+    def request_format(self, frame_format : FrameFormat) -> FrameFormat:
+        if self.__frame_ring is not None:
+            raise RuntimeError("frame format cannot change while capturing in the background")
+
+        # a capture that is not open reports 0 for every property, which would look like raw frames
+        if not self.__capture_object.isOpened():
+            self.__frame_format = FrameFormat.BGR
+            return self.__frame_format
+
+        # raw frames are only YUYV when the device actually delivers that fourcc, anything else stays BGR
+        native = True
+        if frame_format == FrameFormat.YUYV:
+            self.__capture_object.set(cv2.CAP_PROP_FOURCC, YUYV_FOURCC)
+            native = (int(self.__capture_object.get(cv2.CAP_PROP_FOURCC)) & 0xFFFFFFFF) == YUYV_FOURCC
+
+        convert_rgb = frame_format == FrameFormat.BGR or not native
+        self.__capture_object.set(cv2.CAP_PROP_CONVERT_RGB, float(convert_rgb))
+        native = native and self.__capture_object.get(cv2.CAP_PROP_CONVERT_RGB) == float(convert_rgb)
+        if not native and not convert_rgb:
+            self.__capture_object.set(cv2.CAP_PROP_CONVERT_RGB, 1.0)
+        self.__frame_format = frame_format if native else FrameFormat.BGR
+        return self.__frame_format
+
+    def start_capture(self, buffer_count : int = 3) -> bool:
+
+        if self.__frame_ring is not None: return True
+
+        # first frame decides the buffer shape
+        retval, frame = self.__read()
+        if not retval: return False
+
+        self.__frame_ring = FrameRing(frame.shape, buffer_count, frame.dtype)
+        index, buffer = self.__frame_ring.acquire()
+        buffer[...] = frame
+        self.__frame_ring.commit(index)
+
+        self.__capturing = True
+        self.__capture_thread = threading.Thread(target = self.__capture_loop, daemon = True)
+        self.__capture_thread.start()
+        return True
+
+    def stop_capture(self):
+
+        if self.__frame_ring is None: return
+
+        self.__capturing = False
+        if self.__capture_thread is not None:
+            self.__capture_thread.join()
+        self.__frame_ring.close()
+        self.__capture_thread = None
+        self.__frame_ring = None
+
+    def __capture_loop(self):
+
+        while self.__capturing:
+            index, buffer = self.__frame_ring.acquire()
+            # read straight into the ring slot, copy only if the backend reallocated
+            retval, frame = self.__read(buffer)
+            if not retval or frame.shape != buffer.shape: break
+            if frame is not buffer:
+                buffer[...] = frame
+            self.__frame_ring.commit(index)
+
+        self.__frame_ring.close()
+
+    def __set_frame(self, frame) -> bool:
+
+        if frame is None: return False
+        self.__frame = frame
+        self.__image_height, self.__image_width = self.__frame.shape[:2]
+        return True
+
+    # most recent frame, duplicates the previous one if nothing new arrived
+    def latest_frame(self) -> bool:
+        if self.__frame_ring is None: return False
+        frame_ring = self.__frame_ring
+        if frame_ring.closed: return False
+        return self.__set_frame(frame_ring.latest())
+
+    # oldest frame not yet delivered, waits for the capture thread if needed
+    def next_frame(self, timeout : float = None) -> bool:
+        if self.__frame_ring is None: return False
+        return self.__set_frame(self.__frame_ring.next(timeout))
+
+    @property
+    def capturing(self):
+        return self.__frame_ring is not None and not self.__frame_ring.closed
+
+    @property
+    def dropped_frames(self):
+        return self.__frame_ring.dropped if self.__frame_ring is not None else 0
+
+    @property
+    def duplicated_frames(self):
+        return self.__frame_ring.duplicated if self.__frame_ring is not None else 0
+
+    @property
+    def frame_format(self):
+        return self.__frame_format
+
+    # converted (and resized when size = (width, height) is given) copy of the current frame
+    # written into a buffer kept per (code, size), valid until the next call with the same arguments
+    # code None only resizes, otherwise the conversion runs on the smaller image
+    def convert_image(self, code : int = cv2.COLOR_BGR2RGB, size = None, interpolation : int = cv2.INTER_AREA):
+
+        image = self.__frame
+        if size is not None and tuple(size) == image.shape[1::-1]:
+            size = None
+
+        # packed yuv pixel pairs share chroma, so they are converted before resizing
+        packed = image.ndim == 3 and image.shape[2] == 2
+        if size is not None and not packed:
+            image = self.__resize(image, tuple(size), interpolation)
+        if code is not None:
+            key = (code, image.shape[1::-1])
+            image = cv2.cvtColor(image, code, dst = self.__conversion_buffers.get(key))
+            self.__conversion_buffers[key] = image
+        if size is not None and packed:
+            image = self.__resize(image, tuple(size), interpolation)
+        return image
 
-    def convert_image(self, code : int = cv2.COLOR_BGR2RGB):
+    def __resize(self, image, size, interpolation : int):
+        key = (size, image.shape[2:], image.dtype)
+        if key not in self.__resize_buffers:
+            self.__resize_buffers[key] = np.empty((size[1], size[0]) + image.shape[2:], dtype = image.dtype)
+        return cv2.resize(image, size, dst = self.__resize_buffers[key], interpolation = interpolation)
 
-        return cv2.cvtColor(self.__frame, code)
+    # rgb image for detection whatever the frame format
+    def rgb_image(self, size = None, interpolation : int = cv2.INTER_AREA):
+        return self.convert_image(RGB_CODES[self.__frame_format], size, interpolation)
 
     # non const reference, modifiable
     def frame(self):
@@ -50,26 +332,37 @@ class Camera:
         self.__image_width = image_width
 
     def display_image(self):
+        if not self.__window_name: return
+        if self.__frame_format == FrameFormat.YUYV:
+            cv2.imshow(self.__window_name, self.convert_image(cv2.COLOR_YUV2BGR_YUYV))
+            return
         cv2.imshow(self.__window_name, self.__frame)
 
 if __name__ == "__main__":
     import HandDetect as hd
+    import Metrics as mt
     import Renderer as rdr
   
     camera_object = Camera(camera_index = 1)
-    hand_detector = hd.HandDetect()
+    hand_detector = hd.HandDetect(inference_scale = 0.5, roi_padding = 0.25)
     renderer = rdr.Renderer()
+    camera_object.start_capture()
   
     while True:
         if not camera_object.capture(): break
   
-        main_image_rgb = camera_object.convert_image()
-        success = hand_detector(main_image_rgb, camera_object.image_height, camera_object.image_width)
+        success = hand_detector.detect(camera_object.frame())
         if not success: continue
   
-        hand_detector.render(camera_object.frame(), renderer.render_mp, renderer.render_cv2)
+        hand_detector.render(camera_object.frame(), renderer.render_mp, renderer.render_cv2,
+            render_fn_labels = renderer.render_cv2_labels, render_fn_skeleton = renderer.render_skeleton)
+        if mt.metrics.enabled:
+            mt.metrics.render_hud(camera_object.frame(), renderer.render_cv2)
   
         camera_object.display_image()
   
         key = cv2.waitKey(1) & 0xFF
-        if key == 27: break
\ No newline at end of file
+        if key == 27: break
+        elif key == ord("m"):
+            if mt.metrics.enabled: mt.metrics.disable()
+            else: mt.metrics.enable()
\ No newline at end of file
@@ -0,0 +1,216 @@
+from enum import Enum
+import time
+
+import numpy as np
+
+import Filters as flt
+import HandData as hdata
+
+class GestureAction(Enum):
+    NONE      = 0
+    TRANSLATE = 1
+    ROTATE    = 2
+    SCALE     = 3
+    RESET     = 4
+
+# gesture table entry, matches when the packed finger bits equal fingers exactly
+# and the direction bits selected by directions_mask equal directions
+# gain: graph units per pixel of hand movement (radians for ROTATE, log scale for SCALE)
+class Gesture:
+    def __init__(self, action : GestureAction, fingers : int, directions : int = 0, directions_mask : int = 0,
+        gain : float = 1.0):
+        self.action = action
+        self.fingers = fingers
+        self.directions = directions
+        self.directions_mask = directions_mask
+        self.gain = gain
+
+    def matches(self, finger_bits : int, direction_bits : int) -> bool:
+        return finger_bits == self.fingers and (direction_bits & self.directions_mask) == self.directions
+
+    def __repr__(self):
+        return "Gesture(%s, fingers %s, directions %s/%s, gain %g)" % (self.action.name,
+            format(self.fingers, "05b"), format(self.directions, "06b"), format(self.directions_mask, "06b"), self.gain)
+
+def finger_bits(*fingers) -> int:
+    return sum(1 << index for index, hand_idx in enumerate(hdata.HandIndices) if hand_idx in fingers)
+
+ALL_FINGERS = finger_bits(*hdata.HandIndices)
+
+# open hand moves the graph, index finger rotates it, index and middle scale it, thumb only resets
+DEFAULT_GESTURES = [
+    Gesture(GestureAction.TRANSLATE, ALL_FINGERS, gain = 0.02),
+    Gesture(GestureAction.ROTATE, finger_bits(hdata.HandIndices.INDEX), gain = 0.01),
+    Gesture(GestureAction.SCALE, finger_bits(hdata.HandIndices.INDEX, hdata.HandIndices.MIDDLE), gain = 0.005),
+    Gesture(GestureAction.RESET, finger_bits(hdata.HandIndices.THUMB)) ]
+
+# transform parameters, filtered together as one vector
+TRANSLATION = slice(0, 3)
+ANGLES = slice(3, 5)  # pitch around x, yaw around y
+SCALE = slice(5, 8)
+PARAMETERS = 8
+
+# maps hand state to Graph transforms, applied in the same frame as the gesture
+# the target transform is smoothed with a one euro filter and only written to the graph
+# when it moved by more than epsilon and at most max_rate times per second
+class TransformController:
+    def __init__(self, graph, gestures = None,
+        min_cutoff : float = 1.0, beta : float = 0.05,
+        epsilon : float = 1e-3, max_rate : float = 60.0):
+
+        # controller details
+        self.__graph = graph
+        self.__gestures = list(gestures) if gestures is not None else list(DEFAULT_GESTURES)
+        self.__epsilon = epsilon
+        self.__min_interval = 1.0 / max_rate if max_rate > 0 else 0.0
+
+        # raw target, filtered value and the value last written to the graph
+        self.__target = np.zeros(PARAMETERS, dtype = float)
+        self.__target[SCALE] = 1.0
+        self.__applied = self.__target.copy()
+        self.__filter = flt.OneEuroFilter(PARAMETERS, min_cutoff, beta)
+
+        # hand state of the previous update
+        self.__last_pos = np.zeros(3, dtype = float)
+        self.__tracking = False
+        self.__last_time = None
+        self.__last_apply = -np.inf
+        self.__gesture = None
+
+        # scratch buffers
+        self.__delta = np.zeros(3, dtype = float)
+        self.__quaternion = np.zeros(4, dtype = float)
+
+    @property
+    def gestures(self):
+        return self.__gestures
+
+    # matched gesture of the last update, None when no gesture matched
+    @property
+    def gesture(self):
+        return self.__gesture
+
+    @property
+    def target(self):
+        return self.__target
+
+    @property
+    def translation(self):
+        return self.__applied[TRANSLATION]
+
+    @property
+    def angles(self):
+        return self.__applied[ANGLES]
+
+    @property
+    def scale_factors(self):
+        return self.__applied[SCALE]
+
+    def reset(self):
+        self.__target[:] = 0.0
+        self.__target[SCALE] = 1.0
+        self.__filter.reset()
+        self.__tracking = False
+
+    def __match(self, finger_bits : int, direction_bits : int):
+        for gesture in self.__gestures:
+            if gesture.matches(finger_bits, direction_bits):
+                return gesture
+        return None
+
+    # hand_data: HandData after its update for this frame
+    def update(self, hand_data, timestamp : float = None) -> bool:
+        return self.update_state(hand_data.active_bits, hand_data.directions_bits, hand_data.hand_pos, timestamp)
+
+    # packed bits from HandData / HandTracker, hand_pos: hand centroid (pixel x, y, normalized z)
+    # returns True when the graph transform was updated
+    def update_state(self, finger_bits : int, direction_bits : int, hand_pos, timestamp : float = None) -> bool:
+        timestamp = time.perf_counter() if timestamp is None else timestamp
+        dt = timestamp - self.__last_time if self.__last_time is not None else 0.0
+        self.__last_time = timestamp
+
+        # centroid movement since the last frame, the first frame of a hand does not move anything
+        np.subtract(hand_pos, self.__last_pos, out = self.__delta)
+        self.__last_pos[:] = hand_pos
+        if not self.__tracking:
+            self.__delta[:] = 0.0
+            self.__tracking = True
+
+        gesture = self.__match(int(finger_bits), int(direction_bits))
+        self.__gesture = gesture
+        dx, dy = self.__delta[0], self.__delta[1]
+        if gesture is None:
+            pass
+        elif gesture.action == GestureAction.TRANSLATE:
+            # image y points down, graph y points up
+            self.__target[0] += dx * gesture.gain
+            self.__target[1] -= dy * gesture.gain
+        elif gesture.action == GestureAction.ROTATE:
+            self.__target[3] += dy * gesture.gain
+            self.__target[4] += dx * gesture.gain
+        elif gesture.action == GestureAction.SCALE:
+            self.__target[SCALE] *= np.exp(-dy * gesture.gain)
+        elif gesture.action == GestureAction.RESET:
+            self.__target[:] = 0.0
+            self.__target[SCALE] = 1.0
+
+        smoothed = self.__filter(self.__target, dt)
+        return self.__apply(smoothed, timestamp)
+
+    # tracking lost, the next hand starts without a jump
+    def lost(self):
+        self.__tracking = False
+
+    def __apply(self, smoothed, timestamp : float) -> bool:
+        if timestamp - self.__last_apply < self.__min_interval: return False
+        changed = np.abs(smoothed - self.__applied) > self.__epsilon
+        if not changed.any(): return False
+
+        # only groups written to the graph count as applied, held back ones keep their last value
+        if changed[TRANSLATION].any():
+            self.__graph.translate(smoothed[TRANSLATION])
+            self.__applied[TRANSLATION] = smoothed[TRANSLATION]
+        if changed[ANGLES].any():
+            # yaw around y after pitch around x
+            pitch, yaw = smoothed[ANGLES] / 2.0
+            self.__quaternion[:] = (np.cos(yaw) * np.cos(pitch), np.cos(yaw) * np.sin(pitch),
+                np.sin(yaw) * np.cos(pitch), -np.sin(yaw) * np.sin(pitch))
+            self.__graph.rotate_quaternion(self.__quaternion)
+            self.__applied[ANGLES] = smoothed[ANGLES]
+        if changed[SCALE].any():
+            self.__graph.scale(smoothed[SCALE])
+            self.__applied[SCALE] = smoothed[SCALE]
+
+        self.__last_apply = timestamp
+        return True
+
+if __name__ == "__main__":
+    import cv2
+    import Camera as cam
+    import Graph as gr
+    import HandDetect as hd
+    import Renderer as rdr
+
+    camera_object = cam.Camera(camera_index = 1)
+    hand_detector = hd.HandDetect(max_num_hands = 1)
+    hand_data = hdata.HandData()
+    renderer = rdr.Renderer()
+    graph = gr.Graph(graph_type = gr.GraphType.SURFACE, backend = gr.GraphBackend.OPENCV)
+    controller = TransformController(graph)
+    camera_object.start_capture()
+
+    while True:
+        if not camera_object.capture(): break
+
+        if hand_detector.detect(camera_object.frame()):
+            hand_data.update(hand_detector.get_details)
+            controller.update(hand_data)
+        else:
+            controller.lost()
+
+        renderer.composite(camera_object.frame(), graph.render_to_image())
+        camera_object.display_image()
+
+        key = cv2.waitKey(1) & 0xFF
+        if key == 27: break
+        elif key == ord("q"): print(controller.gesture)
@@ -0,0 +1,210 @@
+import numpy as np
+
+# (fresh, update) masks written into the given buffers, elements sampled without elapsed time are not updated
+def _masks(initialized, where, dt, fresh, update):
+    np.logical_not(initialized, out = fresh)
+    np.copyto(update, initialized)
+    if where is not None:
+        fresh &= where
+        update &= where
+    update &= np.greater(dt, 0.0)
+    return fresh, update
+
+# vectorized one euro filter, every element of the state is filtered independently
+# min_cutoff (Hz) sets the smoothing at rest, beta how fast the cutoff opens up with speed
+# reference: Casiez et al., 1 Euro Filter, CHI 2012
+class OneEuroFilter:
+    def __init__(self, shape, min_cutoff : float = 1.0, beta : float = 0.0, d_cutoff : float = 1.0):
+
+        # filter state
+        self.__value = np.zeros(shape, dtype = float)
+        self.__derivative = np.zeros(shape, dtype = float)
+        self.__initialized = np.zeros(shape, dtype = bool)
+
+        self.__min_cutoff = min_cutoff
+        self.__beta = beta
+        self.__d_cutoff = d_cutoff
+
+        # scratch buffers
+        self.__scratch = np.zeros(shape, dtype = float)
+        self.__alpha = np.zeros(shape, dtype = float)
+        self.__fresh = np.zeros(shape, dtype = bool)
+        self.__update = np.zeros(shape, dtype = bool)
+
+    @property
+    def value(self):
+        return self.__value
+
+    @property
+    def derivative(self):
+        return self.__derivative
+
+    @property
+    def min_cutoff(self):
+        return self.__min_cutoff
+
+    @min_cutoff.setter
+    def min_cutoff(self, min_cutoff : float):
+        self.__min_cutoff = min_cutoff
+
+    @property
+    def beta(self):
+        return self.__beta
+
+    @beta.setter
+    def beta(self, beta : float):
+        self.__beta = beta
+
+    # elements where is True (all by default) restart from their next sample
+    def reset(self, where = None):
+        if where is None:
+            self.__initialized[...] = False
+        else:
+            self.__initialized[where] = False
+
+    @staticmethod
+    def __smoothing(cutoff, dt, out):
+        # alpha = 1 / (1 + tau / dt), tau = 1 / (2 pi cutoff)
+        np.multiply(cutoff, dt, out = out)
+        out *= 2.0 * np.pi
+        # x / (x + 1) as 1 - 1 / (x + 1), without a temporary
+        out += 1.0
+        np.reciprocal(out, out = out)
+        np.subtract(1.0, out, out = out)
+        return out
+
+    # filters value (same shape as the state) sampled dt seconds after the previous one
+    # dt: seconds, or an array broadcasting against the state, e.g. one per slot
+    # where: optional mask of the elements to update, the others keep their state
+    def __call__(self, value, dt, where = None):
+        value = np.asarray(value, dtype = float)
+        fresh, update = _masks(self.__initialized, where, dt, self.__fresh, self.__update)
+
+        if update.any():
+            # derivative of the raw signal, low passed at d_cutoff
+            scratch, alpha = self.__scratch, self.__alpha
+            np.subtract(value, self.__value, out = scratch)
+            np.divide(scratch, dt, out = scratch, where = update)
+            self.__smoothing(self.__d_cutoff, dt, alpha)
+            scratch -= self.__derivative
+            scratch *= alpha
+            np.add(self.__derivative, scratch, out = self.__derivative, where = update)
+
+            # cutoff grows with speed, then the value is low passed
+            np.abs(self.__derivative, out = scratch)
+            scratch *= self.__beta
+            scratch += self.__min_cutoff
+            self.__smoothing(scratch, dt, alpha)
+            np.subtract(value, self.__value, out = scratch)
+            scratch *= alpha
+            np.add(self.__value, scratch, out = self.__value, where = update)
+
+        np.copyto(self.__value, value, where = fresh)
+        np.copyto(self.__derivative, 0.0, where = fresh)
+        self.__initialized |= fresh
+        return self.__value
+
+# vectorized constant velocity kalman filter, one independent (position, velocity) state per element
+# process_noise: acceleration noise density, measurement_noise: variance of a sample
+# both broadcast against the state shape, e.g. per axis values for pixel x, y and normalized z
+class KalmanFilter:
+    def __init__(self, shape, process_noise = 1.0, measurement_noise = 1.0, velocity_variance = None):
+
+        # filter state
+        self.__value = np.zeros(shape, dtype = float)
+        self.__velocity = np.zeros(shape, dtype = float)
+        self.__p00 = np.zeros(shape, dtype = float)
+        self.__p01 = np.zeros(shape, dtype = float)
+        self.__p11 = np.zeros(shape, dtype = float)
+        self.__initialized = np.zeros(shape, dtype = bool)
+
+        self.__process_noise = np.asarray(process_noise, dtype = float)
+        self.__measurement_noise = np.asarray(measurement_noise, dtype = float)
+        self.__velocity_variance = np.asarray(velocity_variance if velocity_variance is not None
+            else 100.0 * self.__measurement_noise, dtype = float)
+
+        # scratch buffers, predicted state and covariance, gains and masks
+        self.__prior = np.zeros(shape, dtype = float)
+        self.__prior00 = np.zeros(shape, dtype = float)
+        self.__prior01 = np.zeros(shape, dtype = float)
+        self.__prior11 = np.zeros(shape, dtype = float)
+        self.__innovation = np.zeros(shape, dtype = float)
+        self.__gain0 = np.zeros(shape, dtype = float)
+        self.__gain1 = np.zeros(shape, dtype = float)
+        self.__scratch = np.zeros(shape, dtype = float)
+        self.__fresh = np.zeros(shape, dtype = bool)
+        self.__update = np.zeros(shape, dtype = bool)
+
+    @property
+    def value(self):
+        return self.__value
+
+    @property
+    def velocity(self):
+        return self.__velocity
+
+    def reset(self, where = None):
+        if where is None:
+            self.__initialized[...] = False
+        else:
+            self.__initialized[where] = False
+
+    # filters value sampled dt seconds after the previous one, where masks the elements to update
+    # dt: seconds, or an array broadcasting against the state, e.g. one per slot
+    def __call__(self, value, dt, where = None):
+        value = np.asarray(value, dtype = float)
+        fresh, update = _masks(self.__initialized, where, dt, self.__fresh, self.__update)
+
+        if update.any():
+            q, r = self.__process_noise, self.__measurement_noise
+            prior, p00, p01, p11 = self.__prior, self.__prior00, self.__prior01, self.__prior11
+            innovation, gain0, gain1, scratch = self.__innovation, self.__gain0, self.__gain1, self.__scratch
+
+            # predict, p00 = P00 + dt (2 P01 + dt P11) + q dt^3 / 3
+            np.multiply(self.__velocity, dt, out = prior)
+            prior += self.__value
+            np.multiply(self.__p11, dt, out = scratch)
+            scratch += self.__p01
+            scratch += self.__p01
+            scratch *= dt
+            np.add(self.__p00, scratch, out = p00)
+            np.multiply(q, np.power(dt, 3) / 3.0, out = scratch)
+            p00 += scratch
+            # p01 = P01 + dt P11 + q dt^2 / 2, p11 = P11 + q dt
+            np.multiply(self.__p11, dt, out = p01)
+            p01 += self.__p01
+            np.multiply(q, np.square(dt) / 2.0, out = scratch)
+            p01 += scratch
+            np.multiply(q, dt, out = p11)
+            p11 += self.__p11
+
+            # correct
+            np.subtract(value, prior, out = innovation)
+            np.add(p00, r, out = scratch)
+            np.divide(p00, scratch, out = gain0)
+            np.divide(p01, scratch, out = gain1)
+
+            np.multiply(gain0, innovation, out = scratch)
+            scratch += prior
+            np.copyto(self.__value, scratch, where = update)
+            np.multiply(gain1, innovation, out = scratch)
+            scratch += self.__velocity
+            np.copyto(self.__velocity, scratch, where = update)
+            # P11 = p11 - gain1 p01, P00 = (1 - gain0) p00, P01 = (1 - gain0) p01
+            np.multiply(gain1, p01, out = scratch)
+            np.subtract(p11, scratch, out = scratch)
+            np.copyto(self.__p11, scratch, where = update)
+            np.multiply(gain0, p00, out = scratch)
+            np.subtract(p00, scratch, out = scratch)
+            np.copyto(self.__p00, scratch, where = update)
+            np.multiply(gain0, p01, out = scratch)
+            np.subtract(p01, scratch, out = scratch)
+            np.copyto(self.__p01, scratch, where = update)
+
+        np.copyto(self.__value, value, where = fresh)
+        np.copyto(self.__velocity, 0.0, where = fresh)
+        np.copyto(self.__p00, np.broadcast_to(self.__measurement_noise, self.__value.shape), where = fresh)
+        np.copyto(self.__p01, 0.0, where = fresh)
+        np.copyto(self.__p11, np.broadcast_to(self.__velocity_variance, self.__value.shape), where = fresh)
+        self.__initialized |= fresh
+        return self.__value
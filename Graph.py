@@ -1,10 +1,10 @@
-from mpl_toolkits import mplot3d
 import numpy as np
-from matplotlib.backends.backend_agg import FigureCanvasAgg
-import matplotlib.pyplot as plt
 from enum import Enum
+from collections import OrderedDict
 import cv2
-from scipy import linalg
+import Transform as tf
+
+# matplotlib is imported on first use, the opencv backend runs without it
 
 class GraphType(Enum):
     LINE      = 0
@@ -12,12 +12,292 @@ class GraphType(Enum):
     SURFACE   = 2
     CONTOUR   = 3
 
+class GraphBackend(Enum):
+    MATPLOTLIB = 0
+    OPENCV     = 1
+
 class CoordinateSys(Enum):
     IDENTITY = 0
     ORTHOPRJ = 1
     PRLLPRJ  = 2
     SKEW     = 3
 
+# same default lighting as mplot3d plot_surface (LightSource(azdeg = 225, altdeg = 19.4712).direction)
+# so edited surfaces match freshly created ones
+def light_direction(azdeg : float, altdeg : float):
+    azimuth, altitude = np.radians(90 - azdeg), np.radians(altdeg)
+    return np.array([np.cos(azimuth) * np.cos(altitude), np.sin(azimuth) * np.cos(altitude), np.sin(altitude)])
+
+SURFACE_LIGHT = light_direction(225, 19.4712)
+
+# matplotlib figure size, the native backend renders at the same size
+FIGURE_SIZE = (640, 480)
+FIGURE_DPI = 100
+
+# brightness in [0.3, 1] of every (quads, 4, 3) face
+def surface_shade(quads):
+    normals = np.cross(quads[:, 0] - quads[:, 1], quads[:, 1] - quads[:, 2])
+    with np.errstate(invalid = "ignore"):
+        shade = (normals / np.linalg.norm(normals, axis = 1, keepdims = True)) @ SURFACE_LIGHT
+    shade[np.isnan(shade)] = 0
+    return 0.3 + 0.35 * (shade + 1)
+
+# fixed surface colour, the blue of the native backend, so recreating a surface never takes the next cycle colour
+SURFACE_COLOR = "#1f77b4"
+
+def shade_colors(quads, color = SURFACE_COLOR):
+    from matplotlib.colors import to_rgba
+    colors = np.tile(to_rgba(color), (len(quads), 1))
+    colors[:, :3] *= surface_shade(quads)[:, None]
+    return colors
+
+# relative axis lengths of the mplot3d box
+BOX_ASPECT = np.array([1.0, 1.0, 0.75])
+
+# draws graph meshes with numpy projection and opencv primitives, much cheaper than mplot3d
+# orthographic view with the same default angles as mplot3d
+class ProjectionRenderer:
+    def __init__(self, width : int = 640, height : int = 480,
+    color = (180, 119, 31), thickness : int = 1,
+    elevation : float = 30.0, azimuth : float = -60.0, margin : float = 0.1,
+    antialias : bool = True, shade_levels : int = 8, depth_slabs : int = 16,
+    max_surface_quads : int = 2500):
+
+        # output details
+        self.__width = width
+        self.__height = height
+        self.__color = np.array(color, dtype = float)
+        self.__thickness = thickness
+        self.__margin = margin
+        self.__line_type = cv2.LINE_AA if antialias else cv2.LINE_8
+
+        # surface details
+        # max_surface_quads: denser meshes are painted with every n-th row and column, 0 paints every quad
+        self.__shade_levels = shade_levels
+        self.__depth_slabs = depth_slabs
+        self.__max_surface_quads = max_surface_quads
+
+        # transform details
+        self.__normalize = np.identity(4)
+        self.__view = np.identity(4)
+        self.set_view(elevation, azimuth)
+
+        # reused buffers, reallocated only when the mesh size changes
+        self.__points = np.zeros((0, 4))
+        self.__world = np.zeros((0, 4))
+        self.__screen = np.zeros((0, 4))
+        self.__image = None
+
+    @property
+    def width(self):
+        return self.__width
+
+    @property
+    def height(self):
+        return self.__height
+
+    def set_view(self, elevation : float, azimuth : float):
+        elevation, azimuth = np.radians(elevation), np.radians(azimuth)
+        right = np.array([-np.sin(azimuth), np.cos(azimuth), 0.0])
+        up = np.array([-np.sin(elevation) * np.cos(azimuth), -np.sin(elevation) * np.sin(azimuth), np.cos(elevation)])
+        eye = np.array([np.cos(elevation) * np.cos(azimuth), np.cos(elevation) * np.sin(azimuth), np.sin(elevation)])
+
+        # unit box -> pixels, image y points down, z is depth towards the viewer
+        size = (1.0 - 2.0 * self.__margin) * min(self.__width, self.__height) / np.sqrt(3.0)
+        self.__view = np.identity(4)
+        self.__view[0, :3] = size * right
+        self.__view[1, :3] = -size * up
+        self.__view[2, :3] = eye
+        self.__view[0, 3] = self.__width / 2.0
+        self.__view[1, 3] = self.__height / 2.0
+
+    # maps the data bounds onto a unit box around the origin, plays the role of the axis limits
+    def fit(self, x, y, z):
+        low = np.array([np.min(x), np.min(y), np.min(z)], dtype = float)
+        high = np.array([np.max(x), np.max(y), np.max(z)], dtype = float)
+        extent = high - low
+        extent[extent == 0] = 1.0
+
+        self.__normalize = np.identity(4)
+        self.__normalize[[0, 1, 2], [0, 1, 2]] = BOX_ASPECT / extent
+        self.__normalize[:3, 3] = -(low + high) / 2.0 * BOX_ASPECT / extent
+
+    def __project(self, x, y, z, model):
+        count = np.size(x)
+        if len(self.__points) != count:
+            self.__points = np.ones((count, 4))
+            self.__world = np.empty((count, 4))
+            self.__screen = np.empty((count, 4))
+
+        self.__points[:, 0] = np.ravel(x)
+        self.__points[:, 1] = np.ravel(y)
+        self.__points[:, 2] = np.ravel(z)
+
+        # one batched multiply per space, the model matrix is applied to every vertex at once
+        np.matmul(self.__points, model.T, out = self.__world)
+        np.matmul(self.__world, (self.__view @ self.__normalize).T, out = self.__screen)
+        self.__world[:, :3] /= self.__world[:, 3:]
+        self.__screen[:, :3] /= self.__screen[:, 3:]
+        return self.__world, self.__screen
+
+    def render(self, x, y, z, model = None, graph_type = GraphType.LINE, out = None):
+        if out is None:
+            if self.__image is None:
+                self.__image = np.zeros((self.__height, self.__width, 4), dtype = np.uint8)
+            out = self.__image
+        out.fill(0)
+
+        model = np.identity(4) if model is None else model
+        rows, columns = np.shape(x) if np.ndim(x) == 2 else (1, np.size(x))
+        world, screen = self.__project(x, y, z, model)
+        pixels = np.rint(screen[:, :2]).astype(np.int32).reshape((rows, columns, 2))
+        color = tuple(self.__color.tolist()) + (255,)
+
+        if graph_type == GraphType.LINE:
+            cv2.polylines(out, [pixels.reshape((-1, 1, 2))], False, color, self.__thickness, self.__line_type)
+        elif graph_type == GraphType.WIREFRAME:
+            cv2.polylines(out, pixels, False, color, self.__thickness, self.__line_type)
+            cv2.polylines(out, np.ascontiguousarray(pixels.swapaxes(0, 1)), False, color, self.__thickness, self.__line_type)
+        elif graph_type == GraphType.SURFACE and rows > 1 and columns > 1:
+            self.__render_surface(out, world[:, :3].reshape((rows, columns, 3)), screen[:, 2].reshape((rows, columns)), pixels)
+        return out
+
+    def __render_surface(self, out, world, depth, pixels):
+        # fillPoly cost grows with the quad count, quads of a few pixels add cost but no visible detail
+        rows, columns = depth.shape
+        quad_count = (rows - 1) * (columns - 1)
+        if self.__max_surface_quads > 0 and quad_count > self.__max_surface_quads:
+            stride = int(np.ceil(np.sqrt(quad_count / self.__max_surface_quads)))
+            kept = np.ix_(np.unique(np.append(np.arange(0, rows, stride), rows - 1)),
+                np.unique(np.append(np.arange(0, columns, stride), columns - 1)))
+            world, depth, pixels = world[kept], depth[kept], pixels[kept]
+
+        # quads in the same vertex order as plot_surface, so shading matches
+        def corners(grid):
+            return np.stack((grid[:-1, :-1], grid[:-1, 1:], grid[1:, 1:], grid[1:, :-1]), axis = 2).reshape((-1, 4) + grid.shape[2:])
+        quads = corners(pixels)
+        levels = np.minimum((surface_shade(corners(world)) - 0.3) / 0.7 * self.__shade_levels,
+            self.__shade_levels - 1).astype(int)
+        quad_depth = corners(depth).mean(axis = 1)
+
+        # painter's algorithm over depth slabs, one fillPoly per (slab, shade) group
+        span = np.ptp(quad_depth) or 1.0
+        slabs = np.minimum(((quad_depth - quad_depth.min()) / span * self.__depth_slabs).astype(int), self.__depth_slabs - 1)
+        order = np.lexsort((levels, slabs))
+        groups = slabs[order] * self.__shade_levels + levels[order]
+        bounds = np.flatnonzero(np.diff(groups)) + 1
+        for group in np.split(order, bounds):
+            shade = 0.3 + 0.7 * (levels[group[0]] + 0.5) / self.__shade_levels
+            cv2.fillPoly(out, quads[group], tuple((self.__color * shade).tolist()) + (255,))
+
+# evaluated equation meshes keyed by (equation, domain, resolution), least recently used evicted past max_bytes
+# ranges: ((x min, x max),) for 2d graphs, ((x min, x max), (y min, y max)) for 3d graphs
+# resolution: points per axis, same length as ranges
+class SurfaceCache:
+    def __init__(self, max_bytes : int = 64 * 1024 * 1024):
+        self.__meshes = OrderedDict()
+        self.__max_bytes = max_bytes
+        self.__bytes = 0
+        self.__hits = 0
+        self.__reuses = 0
+        self.__misses = 0
+
+    def __len__(self):
+        return len(self.__meshes)
+
+    @property
+    def bytes(self):
+        return self.__bytes
+
+    @property
+    def max_bytes(self):
+        return self.__max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, max_bytes : int):
+        self.__max_bytes = max_bytes
+        self.__evict()
+
+    # (exact hits, resampled from a cached grid, evaluated)
+    @property
+    def stats(self):
+        return self.__hits, self.__reuses, self.__misses
+
+    def clear(self):
+        self.__meshes.clear()
+        self.__bytes = 0
+
+    @staticmethod
+    def __key(equation, ranges, resolution):
+        return (equation, tuple((float(low), float(high)) for low, high in ranges), tuple(int(size) for size in resolution))
+
+    # (x, y, z) meshes for 3d graphs, (x, y) for 2d graphs, shared between callers so never edit them
+    def evaluate(self, equation, ranges, resolution):
+        key = self.__key(equation, ranges, resolution)
+        mesh = self.__meshes.get(key)
+        if mesh is not None:
+            self.__meshes.move_to_end(key)
+            self.__hits += 1
+            return mesh
+
+        mesh = self.__resample(key)
+        if mesh is not None:
+            self.__reuses += 1
+        else:
+            self.__misses += 1
+            axes = [np.linspace(low, high, size) for (low, high), size in zip(key[1], key[2])]
+            if len(axes) == 2:
+                x, y = np.meshgrid(*axes)
+                mesh = (x, y, np.asarray(equation(x, y), dtype = float))
+            else:
+                mesh = (axes[0], np.asarray(equation(axes[0]), dtype = float))
+
+        for array in mesh:
+            array.flags.writeable = False
+        self.__insert(key, mesh)
+        return mesh
+
+    # slices of a cached grid of the same equation whose points include every requested point
+    def __resample(self, key):
+        equation, ranges, resolution = key
+        for (cached_equation, cached_ranges, cached_resolution), mesh in reversed(self.__meshes.items()):
+            if cached_equation is not equation or len(cached_ranges) != len(ranges): continue
+            slices = [self.__axis_slice(*cached, *requested) for cached, requested in
+                zip(zip(cached_ranges, cached_resolution), zip(ranges, resolution))]
+            if None in slices: continue
+            # meshgrid arrays are indexed (y, x)
+            index = tuple(reversed(slices))
+            return tuple(np.ascontiguousarray(array[index]) for array in mesh)
+        return None
+
+    @staticmethod
+    def __axis_slice(cached_range, cached_size, requested_range, requested_size):
+        (low, high), (new_low, new_high) = cached_range, requested_range
+        if cached_size < 2 or requested_size < 2: return None
+        spacing = (high - low) / (cached_size - 1)
+        step = (new_high - new_low) / (requested_size - 1) / spacing
+        start = (new_low - low) / spacing
+        if not np.isclose(step, round(step)) or not np.isclose(start, round(start)): return None
+        step, start = int(round(step)), int(round(start))
+        stop = start + (requested_size - 1) * step
+        if step < 1 or start < 0 or stop >= cached_size: return None
+        return slice(start, stop + 1, step)
+
+    def __insert(self, key, mesh):
+        size = sum(array.nbytes for array in mesh)
+        if size > self.__max_bytes: return
+        self.__meshes[key] = mesh
+        self.__bytes += size
+        self.__evict()
+
+    def __evict(self):
+        while self.__bytes > self.__max_bytes and self.__meshes:
+            _, mesh = self.__meshes.popitem(last = False)
+            self.__bytes -= sum(array.nbytes for array in mesh)
+
+# shared by every Graph unless one is given
+surface_cache = SurfaceCache()
+
 class Graph:
     # proj: either "2d" or "3d"
     def __init__(self, 
@@ -25,18 +305,34 @@ class Graph:
     apply_equation = True,
     x_equation = np.linspace(-10, 10, 25),
     y_equation = np.linspace(-10, 10, 25),
-    z_equation = lambda x, y: (np.cos(np.sqrt(x**2 + y**2)))):
+    z_equation = lambda x, y: (np.cos(np.sqrt(x**2 + y**2))),
+    backend = GraphBackend.MATPLOTLIB,
+    cache : SurfaceCache = None):
 
         # graph details
         self.__projection = "3d" if dim3 else "2d"
-        self.__figure = plt.figure()
-        self.__figure.patch.set_alpha(0.0)
-        self.__canvas = FigureCanvasAgg(self.__figure)
-        if dim3:
-            self.__graph = self.__figure.add_subplot(111, projection = "3d")
-        else:
-            self.__graph = self.__figure.add_subplot()
         self.__graph_type = graph_type
+        self.__dirty = True
+
+        # matplotlib figure, created by the first matplotlib render
+        self.__figure = None
+        self.__canvas = None
+        self.__graph = None
+
+        # native backend, same image size as the matplotlib canvas
+        self.__backend = backend
+        self.__projection_renderer = ProjectionRenderer(*FIGURE_SIZE)
+        if not dim3:
+            self.__projection_renderer.set_view(90.0, -90.0)
+        self.__fitted = False
+
+        # render cache, artists are reused and only redrawn when something changed
+        self.__artists = []
+        self.__artist_key = None
+        self.__surface_shape = None
+        self.__background = None
+        self.__image = None
+        self.__image_stale = False
 
         # coordinate system details
         self.__coordsys  = np.identity(4)
@@ -44,6 +340,28 @@ class Graph:
         self.__rotate    = np.identity(4)
         self.__translate = np.identity(4)
 
+        # model = coordsys . translate . rotate . scale, recomputed only after a component changed
+        self.__model = np.identity(4)
+        self.__model_scratch = np.identity(4)
+        self.__model_dirty = False
+        self.__model_identity = True
+
+        # homogeneous mesh points and their transformed copy, (4, points) each
+        # refilled in place when the equations change to a mesh of the same size
+        self.__points = None
+        self.__transformed = None
+        self.__points_stale = True
+
+        # equation and domain, meshes for set_surface() and zoom() come from the cache
+        self.__cache = cache if cache is not None else surface_cache
+        self.__equation = None
+        self.__ranges = None
+        self.__resolution = None
+        if apply_equation:
+            self.__equation = z_equation if dim3 else y_equation
+            self.__ranges = ((x_equation[0], x_equation[-1]), (y_equation[0], y_equation[-1])) if dim3 else ((x_equation[0], x_equation[-1]),)
+            self.__resolution = (len(x_equation), len(y_equation)) if dim3 else (len(x_equation),)
+
         # axis details
         if apply_equation:
             if dim3:
@@ -75,6 +393,9 @@ class Graph:
     @x_equation.setter
     def x_equation(self, x_equation):
         self.__x_equation = x_equation
+        self.__fitted = False
+        self.__points_stale = True
+        self.__dirty = True
 
     @property
     def y_equation(self):
@@ -83,6 +404,9 @@ class Graph:
     @y_equation.setter
     def y_equation(self, y_equation):
         self.__y_equation = y_equation
+        self.__fitted = False
+        self.__points_stale = True
+        self.__dirty = True
 
     @property
     def z_equation(self):
@@ -91,6 +415,61 @@ class Graph:
     @z_equation.setter
     def z_equation(self, z_equation):
         self.__z_equation = z_equation
+        self.__fitted = False
+        self.__points_stale = True
+        self.__dirty = True
+
+    # swaps the plotted equation and/or domain, unchanged arguments keep their current value
+    # equation: z = f(x, y) for 3d graphs, y = f(x) for 2d graphs
+    # resolution: points per axis, an int applies to every axis
+    def set_surface(self, equation = None, x_range = None, y_range = None, resolution = None):
+        equation = equation if equation is not None else self.__equation
+        if equation is None:
+            raise ValueError("graph was created without an equation, set_surface needs one")
+
+        ranges = list(self.__ranges) if self.__ranges is not None else [(-10.0, 10.0)] * (2 if self.__projection == "3d" else 1)
+        if x_range is not None:
+            ranges[0] = tuple(x_range)
+        if y_range is not None and self.__projection == "3d":
+            ranges[1] = tuple(y_range)
+        if resolution is None:
+            resolution = self.__resolution if self.__resolution is not None else 25
+        if np.isscalar(resolution):
+            resolution = (resolution,) * len(ranges)
+
+        mesh = self.__cache.evaluate(equation, ranges, resolution)
+        self.__equation, self.__ranges, self.__resolution = equation, tuple(ranges), tuple(resolution)
+        if self.__projection == "3d":
+            self.__x_equation, self.__y_equation, self.__z_equation = mesh
+        else:
+            self.__x_equation, self.__y_equation = mesh
+            if np.size(self.__z_equation) != np.size(mesh[0]):
+                self.__z_equation = np.zeros(np.size(mesh[0]), dtype = float)
+        self.__fitted = False
+        self.__points_stale = True
+        self.__dirty = True
+
+    # scales the domain by factor around center (domain center by default), factor < 1 zooms in
+    def zoom(self, factor : float, center = None):
+        if self.__ranges is None:
+            raise ValueError("graph was created without an equation, zoom needs one")
+        if center is None:
+            center = [(low + high) / 2.0 for low, high in self.__ranges]
+        ranges = [(middle - (high - low) * factor / 2.0, middle + (high - low) * factor / 2.0)
+            for (low, high), middle in zip(self.__ranges, np.atleast_1d(center))]
+        self.set_surface(None, *ranges)
+
+    @property
+    def equation(self):
+        return self.__equation
+
+    @property
+    def ranges(self):
+        return self.__ranges
+
+    @property
+    def resolution(self):
+        return self.__resolution
 
     @property
     def projection(self):
@@ -98,12 +477,30 @@ class Graph:
 
     @projection.setter
     def projection(self, projection):
+        import matplotlib.pyplot as plt
         self.__projection = projection
+        self.__artists = []
+        self.__artist_key = None
+        self.__dirty = True
+        self.__axes()
         if projection == "3d":
             self.__graph = plt.axes(projection = projection)
         else:
             self.__graph = plt
     
+    @property
+    def backend(self):
+        return self.__backend
+
+    @backend.setter
+    def backend(self, backend):
+        self.__backend = backend
+        self.__dirty = True
+
+    @property
+    def projection_renderer(self):
+        return self.__projection_renderer
+
     @property
     def graph_type(self):
         return self.__graph_type
@@ -111,87 +508,278 @@ class Graph:
     @graph_type.setter
     def graph_type(self, graph_type):
         self.__graph_type = graph_type
+        self.__dirty = True
 
-    def render_helper(self):
+    @property
+    def dirty(self):
+        return self.__dirty
+
+    # forces the next render to redraw, e.g. after editing the axes directly
+    def invalidate(self):
+        self.__dirty = True
+        self.__artist_key = None
+
+    # figure and axes, matplotlib and mplot3d are imported here the first time
+    def __axes(self):
+        if self.__figure is None:
+            import matplotlib.pyplot as plt
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            from mpl_toolkits import mplot3d
+
+            self.__figure = plt.figure(figsize = (FIGURE_SIZE[0] / FIGURE_DPI, FIGURE_SIZE[1] / FIGURE_DPI), dpi = FIGURE_DPI)
+            self.__figure.patch.set_alpha(0.0)
+            self.__canvas = FigureCanvasAgg(self.__figure)
+            if self.__projection == "3d":
+                self.__graph = self.__figure.add_subplot(111, projection = "3d")
+            else:
+                self.__graph = self.__figure.add_subplot()
+            self.__graph.patch.set_alpha(0.0)
+            self.__dirty = True
+        return self.__graph
+
+    def __plot_data(self):
+        self.model_matrix()
+        if self.__model_identity:
+            return self.__x_equation, self.__y_equation, self.__z_equation
+        return self.transformed()
+
+    def __create_artists(self, x, y, z):
         if self.__projection == "2d":
-            self.__graph.plot(self.__x_equation, self.__y_equation)
-        elif self.__projection == "3d":
-            if self.__graph_type == GraphType.LINE:
-                self.__graph.plot(self.__x_equation, self.__y_equation, self.__z_equation)
-            elif self.__graph_type == GraphType.WIREFRAME:
-                self.__graph.plot_wireframe(self.__x_equation, self.__y_equation, self.__z_equation)
-            elif self.__graph_type == GraphType.SURFACE:
-                self.__graph.plot_surface(self.__x_equation, self.__y_equation, self.__z_equation)
-            elif self.__graph_type == GraphType.CONTOUR:
-                self.__graph.contour(self.__x_equation, self.__y_equation, self.__z_equation)
+            return self.__graph.plot(x, y)
+        if self.__graph_type == GraphType.LINE:
+            return self.__graph.plot(x, y, z)
+        # every row and column of the mesh, as the in place updates draw them
+        elif self.__graph_type == GraphType.WIREFRAME:
+            return [self.__graph.plot_wireframe(x, y, z, rcount = np.shape(x)[0], ccount = np.shape(x)[1])]
+        elif self.__graph_type == GraphType.SURFACE:
+            self.__surface_shape = np.shape(x)
+            return [self.__graph.plot_surface(x, y, z, rcount = np.shape(x)[0], ccount = np.shape(x)[1],
+                color = SURFACE_COLOR)]
+        elif self.__graph_type == GraphType.CONTOUR:
+            return [self.__graph.contour(x, y, z)]
+        return []
+
+    # updates the existing artists in place, False if they have to be recreated
+    def __update_artists(self, x, y, z):
+        if self.__projection == "2d":
+            self.__artists[0].set_data(x, y)
+            return True
+        if self.__graph_type == GraphType.LINE and len(self.__artists) == 1:
+            self.__artists[0].set_data_3d(np.ravel(x), np.ravel(y), np.ravel(z))
+            return True
+        if self.__graph_type == GraphType.WIREFRAME:
+            points = np.stack((x, y, z), axis = -1)
+            self.__artists[0].set_segments(list(points) + list(points.swapaxes(0, 1)))
+            return True
+        if self.__graph_type == GraphType.SURFACE:
+            # the mesh shape the surface was created with, its paths only exist after the first draw
+            if np.shape(x) != self.__surface_shape:
+                return False
+            points = np.stack((x, y, z), axis = -1)
+            quads = np.stack((points[:-1, :-1], points[:-1, 1:], points[1:, 1:], points[1:, :-1]), axis = -2).reshape((-1, 4, 3))
+            self.__artists[0].set_verts(quads)
+            self.__artists[0].set_facecolor(shade_colors(quads))
+            return True
+        # contours cannot be edited in place
+        return False
+
+    def __within_limits(self, x, y, z):
+        limits = [self.__graph.get_xlim(), self.__graph.get_ylim()]
+        data = [x, y]
+        if self.__projection == "3d":
+            limits.append(self.__graph.get_zlim())
+            data.append(z)
+        return all(np.min(values) >= min(limit) and np.max(values) <= max(limit)
+            for values, limit in zip(data, limits))
+
+    # redraws the whole figure and caches everything except the plotted artists
+    # the axis limits come from the untransformed data and are then pinned,
+    # so transforms move the graph inside a fixed view instead of being autoscaled away
+    def __full_draw(self, x, y, z):
+        self.__graph.cla()
+        self.__graph.patch.set_alpha(0.0)
+        self.__artists = self.__create_artists(self.__x_equation, self.__y_equation, self.__z_equation)
+        self.__graph.set_xlim(self.__graph.get_xlim())
+        self.__graph.set_ylim(self.__graph.get_ylim())
+        if self.__projection == "3d":
+            self.__graph.set_zlim(self.__graph.get_zlim())
+        # surfaces are always shaded by shade_colors, as every later in place update does
+        if ((x is not self.__x_equation or (self.__projection == "3d" and self.__graph_type == GraphType.SURFACE))
+            and not self.__update_artists(x, y, z)):
+            for artist in self.__artists:
+                artist.remove()
+            self.__artists = self.__create_artists(x, y, z)
+        for artist in self.__artists:
+            artist.set_animated(True)
+        self.__artist_key = (self.__projection, self.__graph_type)
+
         self.__canvas.draw()
+        self.__background = self.__canvas.copy_from_bbox(self.__figure.bbox)
+        self.__draw_artists()
+
+    # paints the plotted artists over the cached background
+    def __draw_artists(self):
+        self.__canvas.restore_region(self.__background)
+        for artist in self.__artists:
+            if hasattr(artist, "do_3d_projection"):
+                artist.do_3d_projection()
+            self.__graph.draw_artist(artist)
+        self.__canvas.blit(self.__figure.bbox)
+
+    # returns False when nothing changed since the last render
+    def render_helper(self):
+        self.__axes()
+        if not self.__dirty: return False
+
+        x, y, z = self.__plot_data()
+        if (self.__artist_key != (self.__projection, self.__graph_type) or
+            not self.__update_artists(x, y, z) or
+            not self.__within_limits(self.__x_equation, self.__y_equation, self.__z_equation)):
+            self.__full_draw(x, y, z)
+        else:
+            self.__draw_artists()
+
+        self.__dirty = False
+        return True
 
     def render(self, block = False):
+        import matplotlib.pyplot as plt
         self.render_helper()
         plt.show(block)
 
-    def render_to_image(self):
-        self.render_helper()
-
-        mpl_buffer = self.__canvas.buffer_rgba()
-        buffer = np.asarray(mpl_buffer)
-
-        img = np.frombuffer(buffer, dtype = np.uint8)
-        img = img.reshape(self.__canvas.get_width_height()[::-1] + (4,))
-
-        img = cv2.cvtColor(img, cv2.COLOR_RGBA2BGR)
-
-        h, w, _ = img.shape
-        img_bgra = np.concatenate([img, np.full((h, w, 1), 255, dtype = np.uint8)], axis = -1)
+    # combined transform applied to the plotted data
+    def model_matrix(self):
+        if self.__model_dirty:
+            np.matmul(self.__coordsys, self.__translate, out = self.__model_scratch)
+            np.matmul(self.__model_scratch, self.__rotate, out = self.__model)
+            np.matmul(self.__model, self.__scale, out = self.__model_scratch)
+            self.__model[...] = self.__model_scratch
+            self.__model_identity = np.array_equal(self.__model, np.identity(4))
+            self.__model_dirty = False
+        return self.__model
+
+    # equations after the model matrix, views into a buffer reused every call
+    def transformed(self):
+        shape = np.shape(self.__x_equation)
+        if self.__points is None or self.__points.shape[1] != np.size(self.__x_equation):
+            self.__points = np.ones((4, np.size(self.__x_equation)))
+            self.__transformed = np.empty_like(self.__points)
+            self.__points_stale = True
+        if self.__points_stale:
+            self.__points[0] = np.ravel(self.__x_equation)
+            self.__points[1] = np.ravel(self.__y_equation)
+            self.__points[2] = np.ravel(self.__z_equation)
+            self.__points_stale = False
+
+        tf.transform_points(self.model_matrix(), self.__points, self.__transformed)
+        return (self.__transformed[0].reshape(shape),
+                self.__transformed[1].reshape(shape),
+                self.__transformed[2].reshape(shape))
+
+    def __render_native(self, out = None):
+        if not self.__fitted:
+            self.__projection_renderer.fit(self.__x_equation, self.__y_equation, self.__z_equation)
+            self.__fitted = True
+        graph_type = self.__graph_type if self.__projection == "3d" else GraphType.LINE
+        image = self.__projection_renderer.render(self.__x_equation, self.__y_equation, self.__z_equation,
+            self.model_matrix(), graph_type, out)
+
+        # caller buffers never become the cached image, which stays dirty until it is rendered itself
+        if out is None:
+            self.__image = image
+            self.__dirty = False
+        return image
+
+    # opencv writes into dst only when it matches, otherwise it silently allocates a new image
+    @staticmethod
+    def __check_out(out, shape):
+        if out.shape != tuple(shape) or out.dtype != np.uint8 or not out.flags.c_contiguous:
+            raise ValueError("out must be a contiguous %s uint8 array, got %s %s" % (tuple(shape), out.shape, out.dtype))
+
+    # out: optional (height, width, 4) uint8 array reused as destination
+    # save_path: optional file to also write the image to
+    def render_to_image(self, out = None, save_path : str = None):
+        # contours are only drawn by matplotlib
+        if self.__backend == GraphBackend.OPENCV and self.__graph_type != GraphType.CONTOUR:
+            if out is not None:
+                self.__check_out(out, (self.__projection_renderer.height, self.__projection_renderer.width, 4))
+            image = self.__image
+            if self.__dirty or out is not None or image is None:
+                image = self.__render_native(out)
+            if save_path is not None:
+                cv2.imwrite(save_path, image)
+            return image
+
+        redrawn = self.render_helper()
+
+        # agg buffer viewed in place, transparency comes from its own alpha channel
+        buffer = np.asarray(self.__canvas.buffer_rgba())
+        if out is None:
+            if self.__image is None or self.__image.shape != buffer.shape:
+                self.__image = np.empty(buffer.shape, dtype = np.uint8)
+                redrawn = True
+            out = self.__image
+            # nothing changed, reuse the last image
+            if redrawn or self.__image_stale:
+                cv2.cvtColor(buffer, cv2.COLOR_RGBA2BGRA, dst = out)
+                self.__image_stale = False
+        else:
+            self.__check_out(out, buffer.shape)
+            cv2.cvtColor(buffer, cv2.COLOR_RGBA2BGRA, dst = out)
+            # the cached image missed this redraw
+            self.__image_stale = self.__image_stale or redrawn
 
-        mask = np.all(img == [255, 255, 255], axis = -1)
-        img_bgra[mask, -1] = 0
+        if save_path is not None:
+            cv2.imwrite(save_path, out)
 
-        cv2.imwrite("graph_image.png", img_bgra)
+        return out
 
-        return img_bgra
+    def __transform_changed(self):
+        self.__model_dirty = True
+        self.__dirty = True
 
     def scale(self, scale_vec):
-        self.__scale = np.identity(4)
-        self.__scale[0][0] *= scale_vec[0]
-        self.__scale[1][1] *= scale_vec[1]
-        self.__scale[2][2] *= scale_vec[2]
+        tf.scale_matrix(scale_vec, out = self.__scale)
+        self.__transform_changed()
     
+    # angle in radians around rotate_vec
     def rotate(self, rotate_vec, angle):
-        pass
+        tf.rotation_matrix(rotate_vec, angle, out = self.__rotate)
+        self.__transform_changed()
+
+    # quaternion as (w, x, y, z)
+    def rotate_quaternion(self, quaternion):
+        tf.quaternion_matrix(quaternion, out = self.__rotate)
+        self.__transform_changed()
     
     def translate(self, translate_vec):
-        pass
+        tf.translation_matrix(translate_vec, out = self.__translate)
+        self.__transform_changed()
 
+    # core_vec: plane normal for ORTHOPRJ, projection direction for PRLLPRJ, shear factors for SKEW
     def coordinate_system(self, sys_type = CoordinateSys.IDENTITY, core_vec = np.ones(3)):
         if sys_type == CoordinateSys.IDENTITY:
-            self.__coordsys = np.identity(4)
+            tf.identity_matrix(self.__coordsys)
         elif sys_type == CoordinateSys.ORTHOPRJ:
-            pass
+            tf.orthographic_matrix(core_vec, out = self.__coordsys)
         elif sys_type == CoordinateSys.PRLLPRJ:
-            pass
+            tf.parallel_matrix(core_vec, out = self.__coordsys)
         elif sys_type == CoordinateSys.SKEW:
-            pass
+            tf.skew_matrix(core_vec, out = self.__coordsys)
+        self.__transform_changed()
 
 if __name__ == "__main__":
+    import Renderer as rdr
+
     print("Hello")
     graph = Graph()
     graph.graph_type = GraphType.SURFACE
+    renderer = rdr.Renderer()
 
-    bg_image = cv2.cvtColor(cv2.imread("solid_image.jpg"), cv2.COLOR_BGR2BGRA)
-    bg_image_resize = cv2.resize(bg_image, (800, 600), interpolation = cv2.INTER_AREA)
-    graph_image = graph.render_to_image()
-    graph_image_resize = cv2.resize(graph_image, (800, 600), interpolation = cv2.INTER_AREA)
-
-    def blending(bg_image, fg_image):
-        fg_gray = cv2.cvtColor(fg_image, cv2.COLOR_BGRA2GRAY)
-        _, fg_graymask = cv2.threshold(fg_gray, 120, 255, cv2.THRESH_BINARY)
-        bg_or = cv2.bitwise_or(bg_image, bg_image, mask = fg_graymask)
-        fg_graymaskinv = cv2.bitwise_not(fg_gray)
-        fg_maskinv = cv2.bitwise_and(fg_image, fg_image, mask = fg_graymaskinv)
-        return cv2.add(bg_or, fg_maskinv)
-
-    image = blending(bg_image_resize, graph_image_resize)
+    bg_image = cv2.imread("solid_image.jpg")
+    image = cv2.resize(bg_image, (800, 600), interpolation = cv2.INTER_AREA)
+    graph_image = graph.render_to_image(save_path = "graph_image.png")
+    renderer.composite(image, graph_image, scale = 800 / graph_image.shape[1])
 
     while True:
         cv2.imshow("transparent graph", image)
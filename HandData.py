@@ -1,6 +1,8 @@
 from enum import Enum
+import time
 import numpy as np
 from typing import Tuple
+import Filters as flt
 
 class HandIndices(Tuple[int, int], Enum):
     THUMB  = (0, 2  ) # 02 to 04
@@ -17,57 +19,117 @@ class Directions(Enum):
     UP    = 4
     DOWN  = 5
 
+# landmark rows and coordinate columns of the 3 joints tracked per finger, (5, 3) each
+FINGER_ROWS = np.array([[hand_idx.value[1] + add for add in range(3)] for hand_idx in HandIndices])
+FINGER_COLS = np.array([[hand_idx.value[0]] * 3 for hand_idx in HandIndices])
+
+# directions set when the hand moves along (x, y, z) by less / more than the move threshold
+NEGATIVE_DIRECTIONS = [Directions.LEFT.value,  Directions.UP.value,   Directions.FRONT.value]
+POSITIVE_DIRECTIONS = [Directions.RIGHT.value, Directions.DOWN.value, Directions.BACK.value]
+
+# how landmark jitter is handled, THRESHOLD keeps values until they move past the thresholds
+# the filters smooth all 21 x 3 landmarks every update and the positions follow the filtered landmarks
+class Smoothing(Enum):
+    THRESHOLD = 0
+    ONE_EURO  = 1
+    KALMAN    = 2
+
+# filter settings per axis for pixel x, y and normalized z (about a thousandth of the pixel scale)
+FILTER_DEFAULTS = {
+    Smoothing.ONE_EURO : { "min_cutoff" : 1.0, "beta" : np.array([0.007, 0.007, 7.0]) },
+    Smoothing.KALMAN   : { "process_noise" : np.array([5e4, 5e4, 5e-2]), "measurement_noise" : np.array([4.0, 4.0, 4e-6]) } }
+
+def landmark_filter(smoothing : Smoothing, shape, filter_kwargs : dict = None):
+    if smoothing == Smoothing.THRESHOLD:
+        return None
+    kwargs = dict(FILTER_DEFAULTS[smoothing], **(filter_kwargs or {}))
+    if smoothing == Smoothing.ONE_EURO:
+        return flt.OneEuroFilter(shape, **kwargs)
+    return flt.KalmanFilter(shape, **kwargs)
+
+# bit weights packing finger activity (HandIndices order) and directions (Directions values) into ints
+FINGER_BITS = 1 << np.arange(len(HandIndices))
+DIRECTION_BITS = 1 << np.arange(len(Directions))
+
+# array helpers shared by HandData and HandTracker, leading axes are treated as a batch of hands
+
+# replaces current values that moved past the threshold, keeping the replaced ones in previous
+def threshold_update(values, current, previous, thresholds, mask, where = None):
+    np.greater(np.abs(values - current), thresholds, out = mask)
+    if where is not None:
+        mask &= where
+    np.copyto(previous, current, where = mask)
+    np.copyto(current, values, where = mask)
+
+# reducing over landmark rows adds them in order, same rounding as sum() / len()
+def centroid(landmarks, out):
+    np.add.reduce(landmarks, axis = -2, out = out)
+    out /= landmarks.shape[-2]
+    return out
+
+def activity(positions, out):
+    np.less(positions[..., 1], positions[..., 0], out = out)
+    out &= positions[..., 2] < positions[..., 0]
+    return out
+
+# (..., bits) bool masks to (...) ints
+def pack_bits(mask, bits):
+    return mask @ bits
+
+def movement(hand_pos, prev_hand_pos, move_thresholds, delta, out):
+    np.subtract(hand_pos, prev_hand_pos, out = delta)
+    out[..., NEGATIVE_DIRECTIONS] = delta < -move_thresholds
+    out[..., POSITIVE_DIRECTIONS] = delta >  move_thresholds
+    return out
+
 class HandData:
     def __init__(self, threshold : float = 10.0, z_threshold : float = 0.001,
-        move_threshold : float = 2.0, move_z_threshold : float = 0.00001):
-        # raw positions -> can retrieve via hand indices enum
-        self.__position = { 
-            HandIndices.THUMB  : np.zeros((3, 1), dtype = float),
-            HandIndices.INDEX  : np.zeros((3, 1), dtype = float),
-            HandIndices.MIDDLE : np.zeros((3, 1), dtype = float),
-            HandIndices.RING   : np.zeros((3, 1), dtype = float),
-            HandIndices.PINKY  : np.zeros((3, 1), dtype = float) }
+        move_threshold : float = 2.0, move_z_threshold : float = 0.00001,
+        smoothing : Smoothing = Smoothing.THRESHOLD, filter_kwargs : dict = None):
+        # raw positions -> (5, 3) arrays, one row per finger in HandIndices order
+        # the dicts hold (3, 1) views so they can still be retrieved via hand indices enum
+        self.__positions = np.zeros((len(HandIndices), 3), dtype = float)
+        self.__position = { hand_idx : self.__positions[i].reshape((3, 1)) for i, hand_idx in enumerate(HandIndices) }
         #self.__offsets   = np.zeros((21, 2), dtype = float)
         self.__hand_pos = np.zeros((3), dtype = float)
 
         # reference data
-        self.__prev_position = { 
-            HandIndices.THUMB  : np.zeros((3, 1), dtype = float),
-            HandIndices.INDEX  : np.zeros((3, 1), dtype = float),
-            HandIndices.MIDDLE : np.zeros((3, 1), dtype = float),
-            HandIndices.RING   : np.zeros((3, 1), dtype = float),
-            HandIndices.PINKY  : np.zeros((3, 1), dtype = float) }
+        self.__prev_positions = np.zeros((len(HandIndices), 3), dtype = float)
+        self.__prev_position = { hand_idx : self.__prev_positions[i].reshape((3, 1)) for i, hand_idx in enumerate(HandIndices) }
         self.__prev_hand_pos = np.zeros((3), dtype = float)
         #self.__reference_offsets = np.zeros((21, 2), dtype = float)
 
-        # logic data
-        self.__active = { 
-            HandIndices.THUMB  : False,
-            HandIndices.INDEX  : False,
-            HandIndices.MIDDLE : False,
-            HandIndices.RING   : False,
-            HandIndices.PINKY  : False }
-        self.__directions = {
-            Directions.FRONT : False,
-            Directions.BACK  : False,
-            Directions.LEFT  : False,
-            Directions.RIGHT : False,
-            Directions.UP    : False,
-            Directions.DOWN  : False,
-        }
+        # logic data, indexed by HandIndices / Directions order
+        self.__active = np.zeros(len(HandIndices), dtype = bool)
+        self.__directions = np.zeros(len(Directions), dtype = bool)
 
         self.__threshold = threshold
         self.__z_threshold = z_threshold
         self.__move_threshold = move_threshold
         self.__move_z_threshold = move_z_threshold
 
+        # per axis thresholds for the centroid and movement checks
+        self.__hand_thresholds = np.array([threshold, threshold, z_threshold], dtype = float)
+        self.__move_thresholds = np.array([move_threshold, move_threshold, move_z_threshold], dtype = float)
+
+        # scratch buffers
+        self.__finger_mask = np.zeros((len(HandIndices), 3), dtype = bool)
+        self.__hand_mask = np.zeros(3, dtype = bool)
+        self.__centroid = np.zeros(3, dtype = float)
+        self.__delta = np.zeros(3, dtype = float)
+
+        # landmark filter, None for the threshold logic
+        self.__smoothing = smoothing
+        self.__filter = landmark_filter(smoothing, (21, 3), filter_kwargs)
+        self.__last_time = None
+
     @property
     def hand_pos(self):
         return self.__hand_pos
 
     @hand_pos.setter
     def hand_pos(self, hand_pos):
-        self.__hand_pos = hand_pos
+        self.__hand_pos = np.array(hand_pos, dtype = float)
 
     @property
     def prev_hand_pos(self):
@@ -75,92 +137,134 @@ class HandData:
 
     @prev_hand_pos.setter
     def prev_hand_pos(self, prev_hand_pos):
-        self.__prev_hand_pos = prev_hand_pos
+        self.__prev_hand_pos = np.array(prev_hand_pos, dtype = float)
 
     @property
     def active(self):
-        return self.__active
+        return dict(zip(HandIndices, self.__active.tolist()))
 
     @active.setter
     def active(self, active):
-        self.__active = active
+        self.__active[:] = [active[hand_idx] for hand_idx in HandIndices]
 
     @property
     def directions(self):
-        return self.__directions
+        return dict(zip(Directions, self.__directions.tolist()))
 
     @directions.setter
     def directions(self, directions):
-        self.__directions = directions
+        self.__directions[:] = [directions[direction] for direction in Directions]
+
+    # raw arrays in HandIndices / Directions order, no dict building
+    @property
+    def positions(self):
+        return self.__positions
+
+    @property
+    def prev_positions(self):
+        return self.__prev_positions
+
+    @property
+    def active_mask(self):
+        return self.__active
+
+    @property
+    def directions_mask(self):
+        return self.__directions
+
+    @property
+    def smoothing(self):
+        return self.__smoothing
+
+    # (21, 3) filtered landmarks of the last update, None with the threshold logic
+    @property
+    def filtered_landmarks(self):
+        return self.__filter.value if self.__filter is not None else None
+
+    @property
+    def active_bits(self) -> int:
+        return int(pack_bits(self.__active, FINGER_BITS))
+
+    @property
+    def directions_bits(self) -> int:
+        return int(pack_bits(self.__directions, DIRECTION_BITS))
+
+    # landmarks: (21, 2+) array of pixel x, y
+    def finger_position(self, landmarks):
+        threshold_update(landmarks[FINGER_ROWS, FINGER_COLS], self.__positions, self.__prev_positions,
+            self.__threshold, self.__finger_mask)
+
+    # landmarks: (21, 3) array of pixel x, y and normalized z
+    def centroid_position(self, landmarks):
+        centroid(landmarks, self.__centroid)
+        threshold_update(self.__centroid, self.__hand_pos, self.__prev_hand_pos,
+            self.__hand_thresholds, self.__hand_mask)
 
     def position(self, x_pos, y_pos):
-        temparray = np.zeros((21, 2), dtype = float)
-        index = 0
-        for x, y in zip(x_pos, y_pos):
-            temparray[index] = [x, y]
-            index += 1
-        temparray = temparray.astype("float64")
-
-        for hand_idx in HandIndices:
-            coord_idx = hand_idx.value[0]
-            num_idx = hand_idx.value[1]
-            for add in range(3):
-                if abs(temparray[num_idx + add][coord_idx] - self.__position[hand_idx][add]) > self.__threshold:
-                    self.__prev_position[hand_idx][add], self.__position[hand_idx][add] = self.__position[hand_idx][add], temparray[num_idx + add][coord_idx]
+        self.finger_position(np.column_stack((x_pos, y_pos)).astype("float64"))
 
     def hand_position(self, x_pos, y_pos, z_pos):
-        temparray = np.zeros((3), dtype = float)
-        temparray[0] = sum(x_pos) / len(x_pos)
-        temparray[1] = sum(y_pos) / len(y_pos)
-        temparray[2] = sum(z_pos) / len(z_pos)
-
-        for i in range(2):
-            if abs(temparray[i] - self.__hand_pos[i]) > self.__threshold:
-                self.__prev_hand_pos[i], self.__hand_pos[i] = self.__hand_pos[i], temparray[i]
-        if abs(temparray[2] - self.__hand_pos[2]) > self.__z_threshold:
-                self.__prev_hand_pos[2], self.__hand_pos[2] = self.__hand_pos[2], temparray[2]
+        self.centroid_position(np.column_stack((x_pos, y_pos, z_pos)).astype("float64"))
 
     def activity(self):
-        for hand_index, position_set in self.__position.items():
-            self.__active[hand_index] = (position_set[1] < position_set[0]) and (position_set[2] < position_set[0])
+        activity(self.__positions, self.__active)
 
     def movement(self):
-        x_axis = self.__hand_pos[0] - self.__prev_hand_pos[0]
-        self.__directions[Directions.LEFT]  = x_axis < -self.__move_threshold
-        self.__directions[Directions.RIGHT] = x_axis >  self.__move_threshold
+        movement(self.__hand_pos, self.__prev_hand_pos, self.__move_thresholds, self.__delta, self.__directions)
+
+    # landmarks: (21, 3) array as returned per hand by HandDetect.get_details
+    # timestamp: seconds of the detection, used by the filters, now by default
+    def update_landmarks(self, landmarks, timestamp : float = None):
+        landmarks = np.asarray(landmarks, dtype = np.float64)
+        if self.__filter is None:
+            self.finger_position(landmarks)
+            self.centroid_position(landmarks)
+        else:
+            self.__filtered_position(landmarks, timestamp)
+        self.activity()
+        self.movement()
 
-        y_axis = self.__hand_pos[1] - self.__prev_hand_pos[1]
-        self.__directions[Directions.UP]   = y_axis < -self.__move_threshold
-        self.__directions[Directions.DOWN] = y_axis >  self.__move_threshold
+    # filtered landmarks replace the positions every update, previous values are those of the last update
+    def __filtered_position(self, landmarks, timestamp : float = None):
+        timestamp = time.perf_counter() if timestamp is None else timestamp
+        dt = timestamp - self.__last_time if self.__last_time is not None else 0.0
+        self.__last_time = timestamp
 
-        z_axis = self.__hand_pos[2] - self.__prev_hand_pos[2]
-        self.__directions[Directions.FRONT] = z_axis < -self.__move_z_threshold
-        self.__directions[Directions.BACK]  = z_axis > self.__move_z_threshold
+        filtered = self.__filter(landmarks, dt)
+        self.__prev_positions[...] = self.__positions
+        self.__positions[...] = filtered[FINGER_ROWS, FINGER_COLS]
+        self.__prev_hand_pos[...] = self.__hand_pos
+        centroid(filtered, self.__hand_pos)
+
+    # hand lost, the filters restart from the next detection
+    def reset_filter(self):
+        if self.__filter is not None:
+            self.__filter.reset()
+        self.__last_time = None
 
     # catered specifically for HandDetect hand_details
-    def update(self, all_positions_data):
-        x_pos = [sublist[2] for sublist in all_positions_data]
-        y_pos = [sublist[3] for sublist in all_positions_data]
-        z_pos = [sublist[4] for sublist in all_positions_data]
-        self.position(x_pos, y_pos)
-        self.hand_position(x_pos, y_pos, z_pos)
-        self.activity()
-        self.movement()
+    # accepts the (hands, 21, 3) / (21, 3) landmark arrays or the legacy [hand index, id, x, y, z] list
+    def update(self, all_positions_data, timestamp : float = None):
+        if isinstance(all_positions_data, np.ndarray):
+            self.update_landmarks(all_positions_data[0] if all_positions_data.ndim == 3 else all_positions_data, timestamp)
+            return
+        self.update_landmarks([sublist[2:5] for sublist in all_positions_data], timestamp)
 
     def __repr__(self):
+        active, directions = self.active, self.directions
         hand_activity_str = ("Hand Activity:\n\t" +
-            "Thumb: "  + str(self.__active[HandIndices.THUMB])  + "\n\t" +
-            "Index: "  + str(self.__active[HandIndices.INDEX])  + "\n\t" +
-            "Middle: " + str(self.__active[HandIndices.MIDDLE]) + "\n\t" +
-            "Ring: "   + str(self.__active[HandIndices.RING])   + "\n\t" +
-            "Pinky: "  + str(self.__active[HandIndices.PINKY]))
+            "Thumb: "  + str(active[HandIndices.THUMB])  + "\n\t" +
+            "Index: "  + str(active[HandIndices.INDEX])  + "\n\t" +
+            "Middle: " + str(active[HandIndices.MIDDLE]) + "\n\t" +
+            "Ring: "   + str(active[HandIndices.RING])   + "\n\t" +
+            "Pinky: "  + str(active[HandIndices.PINKY]))
         hand_movement_str = ("Hand Movement:\n\t" +
-            "Front: "  + str(self.__directions[Directions.FRONT]) + "\n\t" +
-            "Back: "  + str(self.__directions[Directions.BACK])  + "\n\t" +
-            "Left: " + str(self.__directions[Directions.LEFT])  + "\n\t" +
-            "Right: "   + str(self.__directions[Directions.RIGHT]) + "\n\t" +
-            "Up: "   + str(self.__directions[Directions.UP])    + "\n\t" +
-            "Down: "  + str(self.__directions[Directions.DOWN ]))
+            "Front: "  + str(directions[Directions.FRONT]) + "\n\t" +
+            "Back: "  + str(directions[Directions.BACK])  + "\n\t" +
+            "Left: " + str(directions[Directions.LEFT])  + "\n\t" +
+            "Right: "   + str(directions[Directions.RIGHT]) + "\n\t" +
+            "Up: "   + str(directions[Directions.UP])    + "\n\t" +
+            "Down: "  + str(directions[Directions.DOWN ]))
         prev_hand_pos_str = "Previous Hand Position: (%5.2f, %5.2f, %5.2f)" % (self.__prev_hand_pos[0], self.__prev_hand_pos[1], self.__prev_hand_pos[2])
         hand_pos_str = "Hand Position: (%5.2f, %5.2f, %5.2f)" % (self.__hand_pos[0], self.__hand_pos[1], self.__hand_pos[2])
         previous_pos_str = "Previous Positions:\n\t" + "\n\t".join(
@@ -181,6 +285,226 @@ class HandData:
                 previous_pos_str  + "\n\n" + 
                 pos_str + "\n\n")
 
+# batched HandData for several hands, detections are matched to persistent hand ids every frame
+class HandTracker:
+    def __init__(self, max_num_hands : int = 2, threshold : float = 10.0, z_threshold : float = 0.001,
+        move_threshold : float = 2.0, move_z_threshold : float = 0.00001,
+        max_distance : float = 200.0, max_missed : int = 5,
+        smoothing : Smoothing = Smoothing.THRESHOLD, filter_kwargs : dict = None):
+
+        # slot details, one row per tracked hand
+        self.__ids = np.full(max_num_hands, -1, dtype = int)
+        self.__handedness = np.full(max_num_hands, -1, dtype = np.int8)
+        self.__missed = np.zeros(max_num_hands, dtype = int)
+        self.__next_id = 0
+
+        # hand state, same meaning as the HandData arrays with a leading slot axis
+        self.__positions = np.zeros((max_num_hands, len(HandIndices), 3), dtype = float)
+        self.__prev_positions = np.zeros((max_num_hands, len(HandIndices), 3), dtype = float)
+        self.__hand_pos = np.zeros((max_num_hands, 3), dtype = float)
+        self.__prev_hand_pos = np.zeros((max_num_hands, 3), dtype = float)
+        self.__active = np.zeros((max_num_hands, len(HandIndices)), dtype = bool)
+        self.__directions = np.zeros((max_num_hands, len(Directions)), dtype = bool)
+
+        self.__threshold = threshold
+        self.__hand_thresholds = np.array([threshold, threshold, z_threshold], dtype = float)
+        self.__move_thresholds = np.array([move_threshold, move_threshold, move_z_threshold], dtype = float)
+        self.__max_distance = max_distance
+        self.__max_missed = max_missed
+
+        # scratch buffers
+        self.__landmarks = np.zeros((max_num_hands, 21, 3), dtype = float)
+        self.__centroids = np.zeros((max_num_hands, 3), dtype = float)
+        self.__last_centroids = np.zeros((max_num_hands, 3), dtype = float)
+        self.__matched = np.zeros(max_num_hands, dtype = bool)
+        self.__assignment = np.zeros(0, dtype = int)
+        self.__finger_mask = np.zeros((max_num_hands, len(HandIndices), 3), dtype = bool)
+        self.__hand_mask = np.zeros((max_num_hands, 3), dtype = bool)
+        self.__delta = np.zeros((max_num_hands, 3), dtype = float)
+
+        # landmark filter over every slot, None for the threshold logic
+        self.__smoothing = smoothing
+        self.__filter = landmark_filter(smoothing, (max_num_hands, 21, 3), filter_kwargs)
+        self.__filtered_centroids = np.zeros((max_num_hands, 3), dtype = float)
+        self.__new_slots = np.zeros(max_num_hands, dtype = bool)
+        # last filtered detection of each slot, slots that missed frames get their own dt
+        self.__last_times = np.full(max_num_hands, np.nan)
+        self.__dt = np.zeros((max_num_hands, 1, 1), dtype = float)
+
+    # -1 for free slots
+    @property
+    def ids(self):
+        return self.__ids
+
+    @property
+    def alive(self):
+        return self.__ids >= 0
+
+    @property
+    def handedness(self):
+        return self.__handedness
+
+    # slot of every detection passed to the last update
+    @property
+    def assignment(self):
+        return self.__assignment
+
+    @property
+    def positions(self):
+        return self.__positions
+
+    @property
+    def prev_positions(self):
+        return self.__prev_positions
+
+    @property
+    def hand_pos(self):
+        return self.__hand_pos
+
+    @property
+    def prev_hand_pos(self):
+        return self.__prev_hand_pos
+
+    @property
+    def active_mask(self):
+        return self.__active
+
+    @property
+    def directions_mask(self):
+        return self.__directions
+
+    # packed per slot
+    @property
+    def active_bits(self):
+        return pack_bits(self.__active, FINGER_BITS)
+
+    @property
+    def directions_bits(self):
+        return pack_bits(self.__directions, DIRECTION_BITS)
+
+    # {hand id : {HandIndices : bool}} for the tracked hands
+    @property
+    def active(self):
+        return { int(self.__ids[slot]) : dict(zip(HandIndices, self.__active[slot].tolist()))
+            for slot in np.flatnonzero(self.alive) }
+
+    # {hand id : {Directions : bool}} for the tracked hands
+    @property
+    def directions(self):
+        return { int(self.__ids[slot]) : dict(zip(Directions, self.__directions[slot].tolist()))
+            for slot in np.flatnonzero(self.alive) }
+
+    def slot(self, hand_id : int) -> int:
+        slots = np.flatnonzero(self.__ids == hand_id)
+        return int(slots[0]) if len(slots) else -1
+
+    def __associate(self, centroids, handedness):
+        detections = len(centroids)
+        assignment = np.full(detections, -1, dtype = int)
+
+        # pixel distance between detections and tracked hands, impossible pairs set to inf
+        cost = np.linalg.norm(centroids[:, None, :2] - self.__last_centroids[None, :, :2], axis = -1)
+        cost[:, ~self.alive] = np.inf
+        cost[cost > self.__max_distance] = np.inf
+        if handedness is not None:
+            known = (handedness[:, None] >= 0) & (self.__handedness[None, :] >= 0)
+            cost[known & (handedness[:, None] != self.__handedness[None, :])] = np.inf
+
+        # greedy closest pairs first, at most max_num_hands rounds
+        for _ in range(min(detections, len(self.__ids))):
+            detection, slot = np.unravel_index(np.argmin(cost), cost.shape)
+            if not np.isfinite(cost[detection, slot]): break
+            assignment[detection] = slot
+            cost[detection, :] = np.inf
+            cost[:, slot] = np.inf
+
+        # unmatched detections start new hands in free slots
+        free_slots = np.setdiff1d(np.flatnonzero(~self.alive), assignment)
+        new_detections = np.flatnonzero(assignment < 0)[:len(free_slots)]
+        new_slots = free_slots[:len(new_detections)]
+        assignment[new_detections] = new_slots
+
+        self.__new_slots[:] = False
+        self.__new_slots[new_slots] = True
+        self.__ids[new_slots] = np.arange(self.__next_id, self.__next_id + len(new_slots))
+        self.__next_id += len(new_slots)
+        self.__missed[new_slots] = 0
+        for state in (self.__positions, self.__prev_positions, self.__hand_pos,
+            self.__prev_hand_pos, self.__active, self.__directions):
+            state[new_slots] = 0
+        return assignment
+
+    # details: (hands, 21, 3) array from HandDetect.get_details, handedness from HandDetect.get_handedness
+    def update(self, details, handedness = None, timestamp : float = None):
+        details = np.asarray(details, dtype = np.float64).reshape((-1, 21, 3))
+        if handedness is not None:
+            handedness = np.asarray(handedness)[:len(details)]
+
+        centroids = centroid(details, np.empty((len(details), 3), dtype = float))
+        assignment = self.__associate(centroids, handedness)
+        self.__assignment = assignment
+
+        # scatter matched detections into their slots
+        tracked = assignment >= 0
+        slots = assignment[tracked]
+        self.__matched[:] = False
+        self.__matched[slots] = True
+        self.__landmarks[slots] = details[tracked]
+        self.__centroids[slots] = centroids[tracked]
+        self.__last_centroids[slots] = centroids[tracked]
+        if handedness is not None:
+            self.__handedness[slots] = handedness[tracked]
+
+        # all hands in one pass, unmatched slots keep their state
+        if self.__filter is None:
+            threshold_update(self.__landmarks[:, FINGER_ROWS, FINGER_COLS], self.__positions, self.__prev_positions,
+                self.__threshold, self.__finger_mask, self.__matched[:, None, None])
+            threshold_update(self.__centroids, self.__hand_pos, self.__prev_hand_pos,
+                self.__hand_thresholds, self.__hand_mask, self.__matched[:, None])
+        else:
+            self.__filtered_position(timestamp)
+        activity(self.__positions, self.__active)
+        movement(self.__hand_pos, self.__prev_hand_pos, self.__move_thresholds, self.__delta, self.__directions)
+
+        # drop hands that have not been seen for a while
+        self.__missed[self.alive & ~self.__matched] += 1
+        self.__missed[self.__matched] = 0
+        lost = self.alive & (self.__missed > self.__max_missed)
+        self.__ids[lost] = -1
+        self.__handedness[lost] = -1
+
+    # same as HandData, restricted to the matched slots and restarted for new hands
+    def __filtered_position(self, timestamp : float = None):
+        timestamp = time.perf_counter() if timestamp is None else timestamp
+        dt = self.__dt[:, 0, 0]
+        np.subtract(timestamp, self.__last_times, out = dt)
+        dt[np.isnan(dt) | self.__new_slots] = 0.0
+        self.__last_times[self.__matched] = timestamp
+
+        matched = self.__matched[:, None, None]
+        self.__filter.reset(self.__new_slots)
+        filtered = self.__filter(self.__landmarks, self.__dt, matched)
+        centroid(filtered, self.__filtered_centroids)
+        np.copyto(self.__prev_positions, self.__positions, where = matched)
+        np.copyto(self.__positions, filtered[:, FINGER_ROWS, FINGER_COLS], where = matched)
+        np.copyto(self.__prev_hand_pos, self.__hand_pos, where = matched[:, 0])
+        np.copyto(self.__hand_pos, self.__filtered_centroids, where = matched[:, 0])
+
+    @property
+    def smoothing(self):
+        return self.__smoothing
+
+    # (slots, 21, 3) filtered landmarks, None with the threshold logic
+    @property
+    def filtered_landmarks(self):
+        return self.__filter.value if self.__filter is not None else None
+
+    def __repr__(self):
+        return "\n".join("Hand ID: %d, Slot: %d, Hand Position: (%5.2f, %5.2f, %5.2f), Active: %d, Directions: %s" % (
+            self.__ids[slot], slot, *self.__hand_pos[slot], self.__active[slot].sum(),
+            ", ".join(direction.name for direction in Directions if self.__directions[slot][direction.value]))
+            for slot in np.flatnonzero(self.alive))
+
 if __name__ == "__main__":
     import Camera as cam
     import HandDetect as hd
@@ -188,24 +512,24 @@ if __name__ == "__main__":
     import cv2
   
     camera_object = cam.Camera(camera_index = 1)
-    hand_detector = hd.HandDetect(max_num_hands = 1)
+    hand_detector = hd.HandDetect(max_num_hands = 2)
     renderer = rdr.Renderer()
-    hand_data = HandData()
+    hand_tracker = HandTracker(max_num_hands = 2)
   
     while True:
         if not camera_object.capture(): break
   
         main_image_rgb = camera_object.convert_image()
         success = hand_detector(main_image_rgb, camera_object.image_height, camera_object.image_width)
+        hand_tracker.update(hand_detector.get_details, hand_detector.get_handedness)
         if not success: continue
-  
-        hand_data.update(hand_detector.get_details)
 
-        hand_detector.render(camera_object.frame(), renderer.render_mp, renderer.render_cv2)
+        hand_detector.render(camera_object.frame(), renderer.render_mp, renderer.render_cv2,
+            render_fn_labels = renderer.render_cv2_labels, render_fn_skeleton = renderer.render_skeleton)
   
         camera_object.display_image()
   
         key = cv2.waitKey(1) & 0xFF
         if key == 27: break
-        elif key == ord("q"): print(repr(hand_data))
-        elif key == ord("w"): print(sum(hand_data.active.values()))
+        elif key == ord("q"): print(repr(hand_tracker))
+        elif key == ord("w"): print({ hand_id : sum(active.values()) for hand_id, active in hand_tracker.active.items() })
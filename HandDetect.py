@@ -1,11 +1,34 @@
-import mediapipe as mp
+import threading
+import numpy as np
+import cv2
+
+HAND_LANDMARKS = 21
+HANDEDNESS = { "Left" : 0, "Right" : 1 }
+ROI_MIN_SIZE = 96
+
+# landmark index pairs joined by the skeleton, the same pairs as mp.solutions.hands.HAND_CONNECTIONS
+HAND_CONNECTIONS = frozenset([
+    (0, 1), (1, 2), (2, 3), (3, 4),
+    (0, 5), (5, 6), (6, 7), (7, 8),
+    (5, 9), (9, 10), (10, 11), (11, 12),
+    (9, 13), (13, 14), (14, 15), (15, 16),
+    (13, 17), (0, 17), (17, 18), (18, 19), (19, 20) ])
+
+# mediapipe is imported on first use, so the landmark layout above is available without it
+def hands_solution():
+    import mediapipe as mp
+    return mp.solutions.hands
 
 # functor to detect hands
 class HandDetect:
     def __init__(self, static_image_mode : bool = False, 
         max_num_hands : int = 2,
         min_detection_confidence : float = 0.5, 
-        min_tracking_confidence : float = 0.5):
+        min_tracking_confidence : float = 0.5,
+        inference_scale : float = 1.0,
+        roi_padding : float = 0.0,
+        roi_refresh : int = 30,
+        warm_up : bool = False):
 
         # required for mp.solutions.hands.Hands()
         # see if it actually needs to be saved
@@ -14,63 +37,263 @@ class HandDetect:
         self.__min_detection_confidence = min_detection_confidence
         self.__min_tracking_confidence  = min_tracking_confidence
         
-        # mediapipe hand objects
-        self.__hand_pipeline = mp.solutions.hands
-        self.__hand_detector = self.__hand_pipeline.Hands(
-            static_image_mode, max_num_hands,
-            min_detection_confidence, min_tracking_confidence)
+        # mediapipe hand objects, the graph is built on first use or by warm_up()
+        self.__hand_detector = None
+        self.__hands_lock = threading.Lock()
+        self.__warm_up_thread = None
 
-        # output objects
+        # output objects, allocated once and filled in place every frame
         self.__hand_processed = None
-        self.__hand_details = []
+        self.__hand_count = 0
+        self.__landmarks  = np.zeros((max_num_hands, HAND_LANDMARKS, 3), dtype = np.float64)
+        self.__handedness = np.full(max_num_hands, -1, dtype = np.int8)
+        self.__scores     = np.zeros(max_num_hands, dtype = np.float32)
+        self.__pixel_scale = np.ones(3, dtype = np.float64)
+        self.__pixel_offset = np.zeros(3, dtype = np.float64)
+
+        if warm_up:
+            self.warm_up(background = True)
+
+        # reduced inference details, used by detect()
+        # inference_scale: resize factor of the image given to mediapipe
+        # roi_padding: crop around the last hands padded by this fraction of their size, 0 disables
+        # roi_refresh: frames between full frame passes so new hands are still found
+        self.__inference_scale = inference_scale
+        self.__roi_padding = roi_padding
+        self.__roi_refresh = roi_refresh
+        self.__roi = None
+        self.__roi_frames = 0
+        self.__resize_buffer = None
+        self.__rgb_buffer = None
+
+    def __hands(self):
+        if self.__hand_detector is None:
+            with self.__hands_lock:
+                if self.__hand_detector is None:
+                    self.__hand_detector = hands_solution().Hands(
+                        self.__static_image_mode, self.__max_num_hands,
+                        self.__min_detection_confidence, self.__min_tracking_confidence)
+        return self.__hand_detector
+
+    # builds the graph and runs it once on a blank image so the first real frame is not slow
+    # background: do it on a thread, the first detection waits for it to finish
+    def warm_up(self, background : bool = False, size = (256, 256)):
+        if background:
+            self.__warm_up_thread = threading.Thread(target = self.warm_up, args = (False, size), daemon = True)
+            self.__warm_up_thread.start()
+            return
+        self.__hands().process(np.zeros((size[1], size[0], 3), dtype = np.uint8))
+
+    # True once the graph is built and a background warm up finished, without waiting for a detection
+    @property
+    def ready(self):
+        warm_up_thread = self.__warm_up_thread
+        return self.__hand_detector is not None and (warm_up_thread is None or not warm_up_thread.is_alive())
 
     def __call__(self, main_image_rgb, height : int, width : int) -> bool:
+        return self.__process(main_image_rgb, (0, 0, width, height), width)
+
+    # region: (x0, y0, x1, y1) of the full frame that main_image_rgb shows, any size
+    def __process(self, main_image_rgb, region, full_width : int) -> bool:
+
+        if self.__warm_up_thread is not None:
+            self.__warm_up_thread.join()
+            self.__warm_up_thread = None
 
         # process image to get hand
-        self.__hand_processed = self.__hand_detector.process(main_image_rgb)
+        self.__hand_processed = self.__hands().process(main_image_rgb)
 
         # edge check
         if not self.__hand_processed.multi_hand_landmarks:
+            self.__hand_count = 0
             return False
 
-        # update hand details list
-        self.__hand_details.clear()
-        for hand_index, hand_landmarks in enumerate(self.__hand_processed.multi_hand_landmarks):
-            for landmark_id, landmarks in enumerate(hand_landmarks.landmark):
-                x, y, z = float(landmarks.x * width), float(landmarks.y * height), float(landmarks.z)
-                self.__hand_details.append([hand_index, landmark_id, x, y, z])
-        self.__hand_details.sort(key = lambda sublist: (sublist[0], sublist[1]))
+        # update hand details, mediapipe already orders them by hand then landmark
+        multi_hand_landmarks = self.__hand_processed.multi_hand_landmarks[:self.__max_num_hands]
+        multi_handedness = self.__hand_processed.multi_handedness or []
+        self.__hand_count = len(multi_hand_landmarks)
+        for hand_index, hand_landmarks in enumerate(multi_hand_landmarks):
+            self.__landmarks[hand_index] = [(landmarks.x, landmarks.y, landmarks.z) for landmarks in hand_landmarks.landmark]
+            if hand_index < len(multi_handedness):
+                classification = multi_handedness[hand_index].classification[0]
+                self.__handedness[hand_index] = HANDEDNESS.get(classification.label, -1)
+                self.__scores[hand_index] = classification.score
+        self.__handedness[self.__hand_count:] = -1
+        self.__scores[self.__hand_count:] = 0.0
+
+        # normalized to full frame pixel coordinates, z stays normalized to the full frame width
+        x0, y0, x1, y1 = region
+        self.__pixel_scale[0], self.__pixel_scale[1] = x1 - x0, y1 - y0
+        self.__pixel_scale[2] = 1.0 if x1 - x0 == full_width else (x1 - x0) / full_width
+        self.__pixel_offset[0], self.__pixel_offset[1] = x0, y0
+        landmarks = self.__landmarks[:self.__hand_count]
+        np.multiply(landmarks, self.__pixel_scale, out = landmarks)
+        np.add(landmarks, self.__pixel_offset, out = landmarks)
         
         return True
 
-    def render(self, main_image, render_fn_hand = None, render_fn_details = None):
+    # crop of the frame to run mediapipe on, full frame unless hands were found recently
+    def __next_region(self, width : int, height : int):
+        if self.__roi is None or self.__roi_frames >= self.__roi_refresh:
+            self.__roi_frames = 0
+            return (0, 0, width, height)
+        self.__roi_frames += 1
+        return self.__roi
 
-        # edge check
-        if not self.__hand_processed.multi_hand_landmarks: return
+    def __update_roi(self, width : int, height : int):
+        if self.__roi_padding <= 0.0 or not self.__hand_count:
+            self.__roi = None
+            return
+
+        # landmark bounding box padded on every side, square so the hand keeps its aspect
+        landmarks = self.__landmarks[:self.__hand_count, :, :2].reshape((-1, 2))
+        low, high = landmarks.min(axis = 0), landmarks.max(axis = 0)
+        center = (low + high) / 2.0
+        half = max((high - low).max() * (0.5 + self.__roi_padding), ROI_MIN_SIZE / 2)
+        x0, y0 = np.maximum(np.floor(center - half), 0).astype(int).tolist()
+        x1, y1 = np.minimum(np.ceil(center + half), (width, height)).astype(int).tolist()
+        self.__roi = None if x1 - x0 < 2 or y1 - y0 < 2 or (x1 - x0 == width and y1 - y0 == height) else (x0, y0, x1, y1)
+
+    # mediapipe landmarks are normalized to the crop, move them to the full frame for render_fn_hand
+    def __remap_processed(self, region, width : int, height : int):
+        x0, y0, x1, y1 = region
+        scale_x, scale_y = (x1 - x0) / width, (y1 - y0) / height
+        offset_x, offset_y = x0 / width, y0 / height
+        for hand_landmarks in self.__hand_processed.multi_hand_landmarks:
+            for landmarks in hand_landmarks.landmark:
+                landmarks.x = landmarks.x * scale_x + offset_x
+                landmarks.y = landmarks.y * scale_y + offset_y
+                landmarks.z = landmarks.z * scale_x
+
+    # detection straight from a camera frame, only the region given to mediapipe is resized and converted
+    # code: color conversion to rgb, None if main_image already is rgb
+    def detect(self, main_image, code = cv2.COLOR_BGR2RGB) -> bool:
+        height, width = main_image.shape[:2]
+        region = self.__next_region(width, height)
+        success = self.__detect_region(main_image, region, code)
+
+        # tracking lost inside the crop, look at the whole frame again
+        if not success and region != (0, 0, width, height):
+            region = (0, 0, width, height)
+            self.__roi_frames = 0
+            success = self.__detect_region(main_image, region, code)
+
+        if success and region != (0, 0, width, height):
+            self.__remap_processed(region, width, height)
+        self.__update_roi(width, height)
+        return success
+
+    def __detect_region(self, main_image, region, code) -> bool:
+        x0, y0, x1, y1 = region
+        image = main_image[y0:y1, x0:x1]
+
+        size = (max(1, int(round((x1 - x0) * self.__inference_scale))), max(1, int(round((y1 - y0) * self.__inference_scale))))
+        if size != (x1 - x0, y1 - y0):
+            if self.__resize_buffer is None or self.__resize_buffer.shape[1::-1] != size:
+                self.__resize_buffer = np.empty((size[1], size[0]) + main_image.shape[2:], dtype = main_image.dtype)
+            image = cv2.resize(image, size, dst = self.__resize_buffer, interpolation = cv2.INTER_AREA)
+
+        if code is not None:
+            if self.__rgb_buffer is None or self.__rgb_buffer.shape[:2] != image.shape[:2]:
+                self.__rgb_buffer = np.empty(image.shape[:2] + (3,), dtype = image.dtype)
+            image = cv2.cvtColor(image, code, dst = self.__rgb_buffer)
+
+        return self.__process(image, region, main_image.shape[1])
+
+    # render_fn_labels(main_image, positions) draws every landmark id at once instead of render_fn_details
+    # render_fn_skeleton(main_image, details, connections) draws all hands at once instead of render_fn_hand
+    def render(self, main_image, render_fn_hand = None, render_fn_details = None, snapshot = None,
+        render_fn_labels = None, render_fn_skeleton = None):
+
+        # snapshot lets another thread render a frame detected earlier
+        hand_landmarks, hand_details = snapshot if snapshot is not None else self.snapshot(copy = False)
+
+        # edge check, snapshots from another process may only carry the details
+        if hand_details is None or not len(hand_details): return
         
-        # render hand landmark indicator
-        if render_fn_hand == None: return
-        for landmarks in self.__hand_processed.multi_hand_landmarks:
-            render_fn_hand(main_image, landmarks, 
-                self.__hand_pipeline.HAND_CONNECTIONS)
-
-        # render details above
-        if render_fn_details == None: return
-        for _, landmark_id, x, y, __ in self.__hand_details:
-            render_fn_details(main_image, str(int(landmark_id)), (int(x) + 10, int(y) + 10))
-
-    # returns 2d array, each element contains (hand index, id, coordinates (3d))
-    # const it
+        # render hand landmark indicator, mediapipe landmarks only without render_fn_skeleton
+        if render_fn_skeleton == None:
+            if render_fn_hand == None: return
+            for landmarks in hand_landmarks:
+                render_fn_hand(main_image, landmarks, 
+                    HAND_CONNECTIONS)
+        render_details(main_image, hand_details, render_fn_details, render_fn_labels, render_fn_skeleton)
+
+    # (landmarks, details) of the last call, safe to keep after the next call when copied
+    def snapshot(self, copy : bool = True):
+        if self.__hand_processed is None or not self.__hand_count:
+            return [], self.__landmarks[:0]
+        hand_landmarks = self.__hand_processed.multi_hand_landmarks
+        if not copy:
+            return hand_landmarks, self.get_details
+        return list(hand_landmarks), self.__landmarks[:self.__hand_count].copy()
+
+    # returns read only (hand count, 21, 3) view of the landmark buffer, pixel x, y and normalized z
+    # valid until the next call
     @property
     def get_details(self):
-        return self.__hand_details
+        details = self.__landmarks[:self.__hand_count]
+        details.flags.writeable = False
+        return details
+
+    # legacy format, 2d list, each element contains (hand index, id, coordinates (3d))
+    @property
+    def get_details_list(self):
+        return details_to_list(self.get_details)
+
+    # 0 for left, 1 for right, -1 if unknown
+    @property
+    def get_handedness(self):
+        handedness = self.__handedness[:self.__hand_count]
+        handedness.flags.writeable = False
+        return handedness
+
+    @property
+    def get_scores(self):
+        scores = self.__scores[:self.__hand_count]
+        scores.flags.writeable = False
+        return scores
+
+    @property
+    def hand_count(self):
+        return self.__hand_count
+
+    @property
+    def max_num_hands(self):
+        return self.__max_num_hands
 
     def __repr__(self):
-        return "\n".join("Hand: %d, Landmark ID: %d, Coordinates(%5.2f, %5.2f, %5.2f)" % (hand, landmark_id, x, y, z) for hand, landmark_id, x, y, z in self.__hand_details)
+        return "\n".join("Hand: %d, Landmark ID: %d, Coordinates(%5.2f, %5.2f, %5.2f)" % (hand, landmark_id, x, y, z) for hand, landmark_id, x, y, z in self.get_details_list)
+
+# draws (hands, 21, 2+) pixel landmarks without a HandDetect, e.g. details that came from another process
+# same render functions as HandDetect.render
+def render_details(main_image, hand_details, render_fn_details = None, render_fn_labels = None, render_fn_skeleton = None):
+    if hand_details is None or not len(hand_details): return
+
+    # render hand landmark indicator
+    if render_fn_skeleton != None:
+        render_fn_skeleton(main_image, hand_details, HAND_CONNECTIONS)
+
+    # render details above
+    positions = np.asarray(hand_details)[..., :2].astype(int) + 10
+    if render_fn_labels != None:
+        render_fn_labels(main_image, positions.reshape((-1, 2)))
+        return
+    if render_fn_details == None: return
+    for hand_positions in positions:
+        for landmark_id, (x, y) in enumerate(hand_positions):
+            render_fn_details(main_image, str(landmark_id), (int(x), int(y)))
+
+# (hands, 21, 3) landmark array to [[hand index, id, x, y, z], ...]
+def details_to_list(details):
+    return [[hand_index, landmark_id, float(x), float(y), float(z)]
+        for hand_index, hand_landmarks in enumerate(details)
+        for landmark_id, (x, y, z) in enumerate(hand_landmarks)]
 
 if __name__ == "__main__":
     print("Hello")
     import cv2
+    import mediapipe as mp
 
     def render_fn_hand(main_image, landmarks, flags):
         mp.solutions.drawing_utils.draw_landmarks(main_image, landmarks, flags)
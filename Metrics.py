@@ -0,0 +1,250 @@
+import bisect
+import functools
+import json
+import os
+import socket
+import sys
+import time
+
+import numpy as np
+
+# histogram bucket bounds in seconds, 10 us to 10 s
+BUCKETS = [scale * 10.0 ** exponent for exponent in range(-5, 1) for scale in (1.0, 2.5, 5.0)] + [10.0]
+
+# methods wrapped by Metrics.enable(), only for modules that are already imported
+TARGETS = {
+    "Camera"     : { "Camera"   : ["capture", "convert_image"] },
+    "HandDetect" : { "HandDetect" : ["__call__", "detect"] },
+    "HandData"   : { "HandData" : ["update"], "HandTracker" : ["update"] },
+    "Graph"      : { "Graph"    : ["render_to_image"] },
+    "Renderer"   : { "Renderer" : ["render_mp", "render_cv2", "render_cv2_labels", "render_skeleton", "composite"] } }
+
+# imported module of that name, and __main__ when that module is the script being run (e.g. python Camera.py)
+def target_modules(module_name : str):
+    modules = [sys.modules.get(module_name)]
+    main = sys.modules.get("__main__")
+    main_file = getattr(main, "__file__", None)
+    if main_file and os.path.splitext(os.path.basename(main_file))[0] == module_name:
+        modules.append(main)
+    return [module for module in modules if module is not None]
+
+# rolling timings of one stage, percentiles over the last window calls and cumulative buckets
+class StageMetrics:
+    def __init__(self, name : str, window : int = 512):
+        self.__name = name
+        self.__durations = np.zeros(window, dtype = float)
+        self.__ends = np.zeros(window, dtype = float)
+        self.__index = 0
+        self.__count = 0
+        self.__sum = 0.0
+        self.__buckets = [0] * (len(BUCKETS) + 1)
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def count(self):
+        return self.__count
+
+    @property
+    def sum(self):
+        return self.__sum
+
+    # cumulative counts per bucket bound, the last one is +Inf
+    @property
+    def buckets(self):
+        counts, total = [], 0
+        for count in self.__buckets:
+            total += count
+            counts.append(total)
+        return counts
+
+    # empties the stage in place, wrappers holding it keep recording into it
+    def clear(self):
+        self.__index = 0
+        self.__count = 0
+        self.__sum = 0.0
+        self.__buckets = [0] * (len(BUCKETS) + 1)
+
+    def record(self, duration : float, end : float):
+        index = self.__index
+        self.__durations[index] = duration
+        self.__ends[index] = end
+        self.__index = (index + 1) % len(self.__durations)
+        self.__count += 1
+        self.__sum += duration
+        self.__buckets[bisect.bisect_left(BUCKETS, duration)] += 1
+
+    def __window(self):
+        size = min(self.__count, len(self.__durations))
+        return self.__durations[:size], self.__ends[:size]
+
+    def percentile(self, percent : float) -> float:
+        durations, _ = self.__window()
+        return float(np.percentile(durations, percent)) if len(durations) else 0.0
+
+    # calls per second over the window
+    @property
+    def rate(self):
+        _, ends = self.__window()
+        if len(ends) < 2: return 0.0
+        span = ends.max() - ends.min()
+        return (len(ends) - 1) / span if span > 0 else 0.0
+
+    def summary(self):
+        durations, _ = self.__window()
+        return {
+            "count"   : self.__count,
+            "rate"    : self.rate,
+            "mean_ms" : float(durations.mean()) * 1000.0 if len(durations) else 0.0,
+            "p50_ms"  : self.percentile(50) * 1000.0,
+            "p90_ms"  : self.percentile(90) * 1000.0,
+            "p99_ms"  : self.percentile(99) * 1000.0,
+            "max_ms"  : float(durations.max()) * 1000.0 if len(durations) else 0.0 }
+
+# no-op context returned by timer() while disabled
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    def __init__(self, stage : StageMetrics):
+        self.__stage = stage
+
+    def __enter__(self):
+        self.__start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        end = time.perf_counter()
+        self.__stage.record(end - self.__start, end)
+        return False
+
+# stage timings of the whole application
+# disabled, the wrapped methods are the original functions again, so there is nothing to pay
+class Metrics:
+    def __init__(self, window : int = 512):
+        self.__window = window
+        self.__stages = {}
+        self.__patched = []
+        self.__enabled = False
+
+    @property
+    def enabled(self):
+        return self.__enabled
+
+    @property
+    def stages(self):
+        return self.__stages
+
+    def stage(self, name : str) -> StageMetrics:
+        stage = self.__stages.get(name)
+        if stage is None:
+            stage = self.__stages[name] = StageMetrics(name, self.__window)
+        return stage
+
+    # with metrics.timer("name"): ... , free while disabled
+    def timer(self, name : str):
+        return _Timer(self.stage(name)) if self.__enabled else _NULL_TIMER
+
+    # decorator for functions outside TARGETS, checks the flag on every call
+    def timed(self, name : str = None):
+        def decorator(function):
+            stage_name = name or function.__qualname__
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.__enabled:
+                    return function(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    end = time.perf_counter()
+                    self.stage(stage_name).record(end - start, end)
+            return wrapper
+        return decorator
+
+    # replaces owner.attribute with a timed wrapper until disable()
+    def instrument(self, owner, attribute : str, name : str = None):
+        function = owner.__dict__[attribute]
+        stage = self.stage(name or "%s.%s" % (owner.__name__, attribute))
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                stage.record(end - start, end)
+
+        setattr(owner, attribute, wrapper)
+        self.__patched.append((owner, attribute, function))
+
+    def enable(self, targets = TARGETS):
+        if self.__enabled: return
+        self.__enabled = True
+        for module_name, classes in targets.items():
+            for module in target_modules(module_name):
+                for class_name, attributes in classes.items():
+                    owner = getattr(module, class_name, None)
+                    for attribute in attributes:
+                        if owner is not None and attribute in owner.__dict__:
+                            self.instrument(owner, attribute)
+
+    def disable(self):
+        self.__enabled = False
+        for owner, attribute, function in reversed(self.__patched):
+            setattr(owner, attribute, function)
+        self.__patched = []
+
+    # stages are cleared in place, so wrappers installed by enable() keep feeding the exported stages
+    def reset(self):
+        for stage in self.__stages.values():
+            stage.clear()
+
+    def to_json(self):
+        return json.dumps({ name : stage.summary() for name, stage in self.__stages.items() })
+
+    # prometheus text exposition format, one histogram labelled by stage
+    def to_prometheus(self, metric : str = "ar_stage_duration_seconds"):
+        lines = ["# HELP %s Time spent per call of each pipeline stage." % metric,
+                 "# TYPE %s histogram" % metric]
+        for name, stage in self.__stages.items():
+            for bound, count in zip(BUCKETS + ["+Inf"], stage.buckets):
+                lines.append('%s_bucket{stage="%s",le="%s"} %d' % (metric, name, bound, count))
+            lines.append('%s_sum{stage="%s"} %.9f' % (metric, name, stage.sum))
+            lines.append('%s_count{stage="%s"} %d' % (metric, name, stage.count))
+        return "\n".join(lines) + "\n"
+
+    # writes to path (replaced atomically) and/or sends one udp datagram to address (host, port)
+    def export(self, path : str = None, address = None, prometheus : bool = False):
+        text = self.to_prometheus() if prometheus else self.to_json()
+        if path is not None:
+            temporary = path + ".tmp"
+            with open(temporary, "w") as file:
+                file.write(text)
+            os.replace(temporary, path)
+        if address is not None:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp:
+                udp.sendto(text.encode(), address)
+        return text
+
+    # one line per stage drawn with render_fn(main_image, text, position), e.g. Renderer.render_cv2
+    def render_hud(self, main_image, render_fn, position = (10, 20), line_height : int = 16):
+        x, y = position
+        for name, stage in self.__stages.items():
+            if not stage.count: continue
+            render_fn(main_image, "%-28s %6.1f/s p50 %6.2f ms p99 %6.2f ms" % (name, stage.rate,
+                stage.percentile(50) * 1000.0, stage.percentile(99) * 1000.0), (x, y))
+            y += line_height
+
+# shared instance used by the demos
+metrics = Metrics()
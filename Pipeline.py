@@ -0,0 +1,357 @@
+import queue
+import threading
+import time
+
+import cv2
+
+import HandDetect as hd
+import SharedFrames as sf
+
+# data passed between stages, one per captured frame
+class PipelineFrame:
+    def __init__(self, index : int, frame, height : int, width : int):
+        self.index = index
+        self.frame = frame
+        self.height = height
+        self.width = width
+
+        # shared memory slot holding frame, -1 when frame is a private array
+        self.slot = -1
+
+        # filled by later stages
+        self.frame_rgb = None
+        self.success = False
+        self.snapshot = ([], None)
+        self.active = None
+        self.directions = None
+
+# worker thread running a single stage, items stay in order as there is one worker per queue
+class PipelineStage:
+    def __init__(self, name : str, function, input_queue = None, output_queue = None, discard_fn = None):
+
+        # stage details
+        # discard_fn(item) frees items a failed stage takes but never passes on
+        self.__name = name
+        self.__function = function
+        self.__discard_fn = discard_fn
+        self.__input_queue = input_queue
+        self.__output_queue = output_queue
+        self.__thread = threading.Thread(target = self.__run, name = name, daemon = True)
+        self.__running = False
+        self.__error = None
+
+        # statistics
+        self.__processed = 0
+        self.__busy_time = 0.0
+        self.__start_time = 0.0
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def queue_depth(self):
+        return self.__input_queue.qsize() if self.__input_queue is not None else 0
+
+    @property
+    def processed(self):
+        return self.__processed
+
+    @property
+    def throughput(self):
+        elapsed = time.perf_counter() - self.__start_time
+        return self.__processed / elapsed if self.__start_time and elapsed > 0 else 0.0
+
+    @property
+    def latency(self):
+        return self.__busy_time / self.__processed if self.__processed else 0.0
+
+    # exception that ended the stage, None while it runs or after a normal end
+    @property
+    def error(self):
+        return self.__error
+
+    def start(self):
+        self.__running = True
+        self.__start_time = time.perf_counter()
+        self.__thread.start()
+
+    def stop(self):
+        self.__running = False
+
+    def join(self, timeout : float = None):
+        self.__thread.join(timeout)
+
+    def is_alive(self):
+        return self.__thread.is_alive()
+
+    def __run(self):
+        try:
+            while True:
+                # source stage has no input and ends on its own or when stopped
+                if self.__input_queue is None:
+                    if not self.__running: break
+                    item = None
+                else:
+                    item = self.__input_queue.get()
+                    if item is None: break
+
+                start = time.perf_counter()
+                try:
+                    result = self.__function(item)
+                except Exception:
+                    self.__discard(item)
+                    raise
+                self.__busy_time += time.perf_counter() - start
+
+                if result is None and self.__input_queue is None: break
+                self.__processed += 1
+                if result is not None and self.__output_queue is not None:
+                    self.__output_queue.put(result)
+        except Exception as error:
+            self.__error = error
+            # keep taking input so earlier stages never block on a full queue
+            if self.__input_queue is not None:
+                while True:
+                    item = self.__input_queue.get()
+                    if item is None: break
+                    self.__discard(item)
+        finally:
+            # end of stream marker for the next stage, also sent when the stage failed
+            if self.__output_queue is not None:
+                self.__output_queue.put(None)
+
+    def __discard(self, item):
+        if item is not None and self.__discard_fn is not None:
+            self.__discard_fn(item)
+
+# capture -> detect -> hand data -> render, each stage on its own worker joined by bounded queues
+class Pipeline:
+    def __init__(self, camera, hand_detector = None, hand_data = None, renderer = None,
+        queue_size : int = 2,
+        detect_in_process : bool = False,
+        detector_kwargs : dict = None,
+        detect_timeout : float = 30.0):
+
+        # pipeline objects
+        self.__camera = camera
+        self.__hand_detector = hand_detector
+        self.__hand_data = hand_data
+        self.__renderer = renderer
+        self.__frame_index = 0
+
+        # detection process details, frames are passed through shared memory slots
+        # a frame returned by get() keeps its slot until the next get()
+        # detect_timeout: seconds a frame may take in the process before the detect stage fails
+        self.__detect_in_process = detect_in_process
+        self.__detect_timeout = detect_timeout
+        self.__detector_kwargs = detector_kwargs if detector_kwargs is not None else {}
+        self.__shared_detector = None
+        self.__frame_pool = None
+        self.__pool_slots = 4 * queue_size + 4
+        self.__last_output = None
+        self.__first_slot = -1
+
+        # bounded queues between stages, output is read by the caller
+        self.__detect_queue = queue.Queue(queue_size)
+        self.__data_queue = queue.Queue(queue_size)
+        self.__render_queue = queue.Queue(queue_size)
+        self.__output_queue = queue.Queue(queue_size)
+
+        self.__stages = [
+            PipelineStage("capture", self.__capture, None, self.__detect_queue),
+            PipelineStage("detect", self.__detect, self.__detect_queue, self.__data_queue, self.__release),
+            PipelineStage("hand_data", self.__update, self.__data_queue, self.__render_queue, self.__release),
+            PipelineStage("render", self.__render, self.__render_queue, self.__output_queue, self.__release) ]
+        self.__running = False
+        self.__error_raised = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def running(self):
+        return self.__running
+
+    @property
+    def stages(self):
+        return self.__stages
+
+    def start(self):
+        if self.__running: return
+
+        if self.__detect_in_process:
+            # first frame decides the slot shape and is the first frame through the pipeline
+            if not self.__camera.capture():
+                raise RuntimeError("camera delivered no frame, cannot size the shared frame pool")
+            self.__frame_pool = sf.SharedFramePool(self.__camera.frame().shape, self.__pool_slots,
+                self.__camera.frame().dtype)
+            slot, buffer = self.__frame_pool.acquire()
+            buffer[...] = self.__camera.frame()
+            self.__first_slot = slot
+            self.__shared_detector = sf.SharedDetector(self.__frame_pool, self.__detector_kwargs)
+
+        self.__running = True
+        for stage in self.__stages:
+            stage.start()
+
+    # first stage error not raised yet, raised once from get() or stop()
+    def __failed(self):
+        return any(stage.error is not None for stage in self.__stages)
+
+    def __raise_error(self):
+        for stage in self.__stages:
+            if stage.error is not None and not self.__error_raised:
+                self.__error_raised = True
+                raise stage.error
+
+    def stop(self):
+        if not self.__running: return
+
+        self.__running = False
+        self.__stages[0].stop()
+
+        # drain so blocked stages can push their end of stream markers
+        while any(stage.is_alive() for stage in self.__stages):
+            try:
+                self.__release(self.__output_queue.get(timeout = 0.01))
+            except queue.Empty:
+                pass
+        for stage in self.__stages:
+            stage.join()
+
+        if self.__shared_detector is not None:
+            self.__shared_detector.close()
+            self.__shared_detector = None
+        if self.__frame_pool is not None:
+            self.__last_output = None
+            self.__first_slot = -1
+            self.__frame_pool.close()
+            self.__frame_pool = None
+        self.__raise_error()
+
+    # gives the shared memory slot of a frame back to the capture stage
+    def __release(self, pipeline_frame):
+        if pipeline_frame is not None and pipeline_frame.slot >= 0 and self.__frame_pool is not None:
+            self.__frame_pool.release(pipeline_frame.slot)
+            pipeline_frame.slot = -1
+
+    # next processed frame in capture order, None at end of stream or on timeout
+    def get(self, timeout : float = None):
+        self.__release(self.__last_output)
+        try:
+            self.__last_output = self.__output_queue.get(timeout = timeout)
+        except queue.Empty:
+            self.__last_output = None
+            return None
+
+        # end of stream, raise the error of a failed stage
+        if self.__last_output is None:
+            self.__raise_error()
+        return self.__last_output
+
+    def __iter__(self):
+        while True:
+            frame = self.get()
+            if frame is None: return
+            yield frame
+
+    # per stage queue depth, processed count, throughput (frames/s) and mean latency (s)
+    def stats(self):
+        return { stage.name : {
+            "queue_depth" : stage.queue_depth,
+            "processed"   : stage.processed,
+            "throughput"  : stage.throughput,
+            "latency"     : stage.latency }
+            for stage in self.__stages }
+
+    def __capture(self, _):
+        # a failed stage ends the stream instead of waiting for the camera to run out
+        if not self.__running or self.__failed(): return None
+
+        # the camera writes straight into a shared slot the detection process can read
+        slot = -1
+        if self.__first_slot >= 0:
+            slot, self.__first_slot = self.__first_slot, -1
+            frame = self.__frame_pool.frame(slot)
+        elif self.__frame_pool is not None:
+            while slot < 0:
+                if not self.__running or self.__failed(): return None
+                acquired = self.__frame_pool.acquire(timeout = 0.1)
+                if acquired is not None:
+                    slot, buffer = acquired
+            if not self.__camera.capture_into(buffer):
+                self.__frame_pool.release(slot)
+                return None
+            frame = buffer
+        else:
+            if not self.__camera.capture(): return None
+
+            # ring buffer slots are reused by the capture thread, so keep a private copy
+            frame = self.__camera.frame()
+            if self.__camera.capturing:
+                frame = frame.copy()
+
+        pipeline_frame = PipelineFrame(self.__frame_index, frame,
+            self.__camera.image_height, self.__camera.image_width)
+        pipeline_frame.slot = slot
+        self.__frame_index += 1
+        return pipeline_frame
+
+    def __detect(self, pipeline_frame):
+        if self.__hand_detector is None and not self.__detect_in_process:
+            return pipeline_frame
+
+        # only the slot index goes to the detection process and only the landmark arrays come back
+        if self.__detect_in_process:
+            _, pipeline_frame.success, details, _, _ = self.__shared_detector(pipeline_frame.slot, self.__detect_timeout)
+            pipeline_frame.snapshot = ([], details)
+            return pipeline_frame
+
+        pipeline_frame.frame_rgb = cv2.cvtColor(pipeline_frame.frame, cv2.COLOR_BGR2RGB)
+        pipeline_frame.success = self.__hand_detector(pipeline_frame.frame_rgb,
+            pipeline_frame.height, pipeline_frame.width)
+        pipeline_frame.snapshot = self.__hand_detector.snapshot()
+        return pipeline_frame
+
+    def __update(self, pipeline_frame):
+        if self.__hand_data is None or not pipeline_frame.success:
+            return pipeline_frame
+
+        self.__hand_data.update(pipeline_frame.snapshot[1])
+        pipeline_frame.active = dict(self.__hand_data.active)
+        pipeline_frame.directions = dict(self.__hand_data.directions)
+        return pipeline_frame
+
+    # drawn from the snapshot details only, so it also works when detection ran in another process
+    def __render(self, pipeline_frame):
+        if self.__renderer is None or not pipeline_frame.success:
+            return pipeline_frame
+
+        hd.render_details(pipeline_frame.frame, pipeline_frame.snapshot[1], self.__renderer.render_cv2,
+            self.__renderer.render_cv2_labels, self.__renderer.render_skeleton)
+        return pipeline_frame
+
+if __name__ == "__main__":
+    import Camera as cam
+    import HandData as hdata
+    import Renderer as rdr
+
+    camera_object = cam.Camera(camera_index = 1)
+    camera_object.start_capture()
+    hand_detector = hd.HandDetect(max_num_hands = 1)
+    pipeline = Pipeline(camera_object, hand_detector, hdata.HandData(), rdr.Renderer())
+
+    with pipeline:
+        for pipeline_frame in pipeline:
+            cv2.imshow("Pipeline Output", pipeline_frame.frame)
+
+            key = cv2.waitKey(1) & 0xFF
+            if key == 27: break
+            elif key == ord("q"): print(pipeline.stats())
+
+    cv2.destroyAllWindows()
@@ -0,0 +1,176 @@
+import os
+import struct
+import time
+
+import numpy as np
+
+import HandDetect as hd
+
+# header: magic, version, max hands, record size, record count, start time, padded to HEADER_SIZE bytes
+MAGIC = b"HLMK"
+VERSION = 1
+HEADER_FORMAT = "<4sIIIQd"
+HEADER_SIZE = 64
+COUNT_OFFSET = struct.calcsize("<4sIII")
+
+# one fixed size record per frame, unused hand slots are zero
+def record_dtype(max_num_hands : int):
+    return np.dtype([
+        ("timestamp",  "<f8"),
+        ("hand_count", "u1"),
+        ("handedness", "i1",  (max_num_hands,)),
+        ("score",      "<f4", (max_num_hands,)),
+        ("landmarks",  "<f4", (max_num_hands, hd.HAND_LANDMARKS, 3)) ])
+
+# appends per frame landmarks to a binary file, the record count in the header is kept up to date on flush
+class LandmarkRecorder:
+    def __init__(self, path : str, max_num_hands : int = 2):
+
+        # file details
+        self.__path = path
+        self.__max_num_hands = max_num_hands
+        self.__file = open(path, "wb")
+        self.__start_time = time.time()
+        self.__count = 0
+
+        # single record reused for every frame
+        self.__record = np.zeros(1, dtype = record_dtype(max_num_hands))
+        self.__write_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __write_header(self):
+        header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, self.__max_num_hands,
+            self.__record.itemsize, self.__count, self.__start_time)
+        self.__file.write(header.ljust(HEADER_SIZE, b"\0"))
+
+    @property
+    def path(self):
+        return self.__path
+
+    @property
+    def count(self):
+        return self.__count
+
+    # details: (hands, 21, 3) landmarks as from HandDetect.get_details, extra hands are dropped
+    def record(self, details, handedness = None, scores = None, timestamp : float = None):
+        record = self.__record
+        hand_count = min(len(details), self.__max_num_hands)
+
+        record["timestamp"] = time.time() if timestamp is None else timestamp
+        record["hand_count"] = hand_count
+        record["landmarks"][0, :hand_count] = details[:hand_count]
+        record["landmarks"][0, hand_count:] = 0.0
+        record["handedness"] = -1
+        record["score"] = 0.0
+        if handedness is not None:
+            record["handedness"][0, :hand_count] = handedness[:hand_count]
+        if scores is not None:
+            record["score"][0, :hand_count] = scores[:hand_count]
+
+        self.__file.write(self.__record.data)
+        self.__count += 1
+
+    def record_detector(self, hand_detector, timestamp : float = None):
+        self.record(hand_detector.get_details, hand_detector.get_handedness, hand_detector.get_scores, timestamp)
+
+    def flush(self):
+        position = self.__file.tell()
+        self.__file.seek(COUNT_OFFSET)
+        self.__file.write(struct.pack("<Q", self.__count))
+        self.__file.seek(position)
+        self.__file.flush()
+
+    def close(self):
+        if self.__file.closed: return
+        self.flush()
+        self.__file.close()
+
+# memory maps a recording, every accessor returns views into the file without copying
+class LandmarkReplay:
+    def __init__(self, path : str):
+
+        with open(path, "rb") as file:
+            magic, version, max_num_hands, record_size, count, start_time = struct.unpack(
+                HEADER_FORMAT, file.read(struct.calcsize(HEADER_FORMAT)))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a landmark recording" % path)
+
+        dtype = record_dtype(max_num_hands)
+        if dtype.itemsize != record_size:
+            raise ValueError("%s has records of %d bytes, expected %d" % (path, record_size, dtype.itemsize))
+
+        # recordings that were not closed still hold every complete record, a partly written last one is left out
+        self.__path = path
+        self.__max_num_hands = max_num_hands
+        self.__start_time = start_time
+        complete = (os.path.getsize(path) - HEADER_SIZE) // dtype.itemsize
+        if complete <= 0:
+            self.__records = np.zeros(0, dtype = dtype)
+            return
+        self.__records = np.memmap(path, dtype = dtype, mode = "r", offset = HEADER_SIZE, shape = (complete,))
+        if count and count <= len(self.__records):
+            self.__records = self.__records[:count]
+
+    def __len__(self):
+        return len(self.__records)
+
+    # (timestamp, details (hands, 21, 3), handedness, scores) of a frame
+    def __getitem__(self, index : int):
+        records = self.__records
+        hand_count = int(records["hand_count"][index])
+        return (float(records["timestamp"][index]), records["landmarks"][index, :hand_count],
+            records["handedness"][index, :hand_count], records["score"][index, :hand_count])
+
+    def __iter__(self):
+        for index in range(len(self.__records)):
+            yield self[index]
+
+    @property
+    def path(self):
+        return self.__path
+
+    @property
+    def max_num_hands(self):
+        return self.__max_num_hands
+
+    @property
+    def start_time(self):
+        return self.__start_time
+
+    # whole columns, (frames,) and (frames, max hands, ...)
+    @property
+    def timestamps(self):
+        return self.__records["timestamp"]
+
+    @property
+    def hand_counts(self):
+        return self.__records["hand_count"]
+
+    @property
+    def landmarks(self):
+        return self.__records["landmarks"]
+
+    @property
+    def handedness(self):
+        return self.__records["handedness"]
+
+    @property
+    def scores(self):
+        return self.__records["score"]
+
+if __name__ == "__main__":
+    import sys
+    import HandData as hdata
+
+    # replays a recording through HandData, printing the gesture state of every frame
+    hand_data = hdata.HandData()
+    for timestamp, details, handedness, scores in LandmarkReplay(sys.argv[1]):
+        if not len(details): continue
+        hand_data.update(details)
+        print("%.3f" % timestamp, [hand_idx.name for hand_idx, active in hand_data.active.items() if active],
+            [direction.name for direction, moving in hand_data.directions.items() if moving])
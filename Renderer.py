@@ -1,7 +1,14 @@
-import mediapipe as mp
 import cv2
+import numpy as np
 from typing import Tuple
 
+# same fields as mediapipe's DrawingSpec, converted when mediapipe itself draws
+class DrawingSpec:
+    def __init__(self, color : Tuple[int, int, int] = (224, 224, 224), thickness : int = 2, circle_radius : int = 2):
+        self.color = color
+        self.thickness = thickness
+        self.circle_radius = circle_radius
+
 class Renderer:
     def __init__(self, 
       # mediapipe
@@ -16,12 +23,13 @@ class Renderer:
     cv2_text_color : Tuple[int, int, int] = (0, 0, 255),
     cv2_text_thickness : int = 1):
 
-        # mediapipe renderer
-        self.__mp_renderer     = mp.solutions.drawing_utils
+        # mediapipe renderer, drawing_utils is only imported by render_mp()
+        self.__mp_renderer     = None
+        self.__mp_specs        = None
           # mediapipe line
-        self.__mp_line_specs   = self.__mp_renderer.DrawingSpec(mp_line_color,  mp_line_thickness)
+        self.__mp_line_specs   = DrawingSpec(mp_line_color,  mp_line_thickness)
           # mediapipe circle
-        self.__mp_circle_specs = self.__mp_renderer.DrawingSpec(mp_circle_color,    mp_circle_thickness, mp_circle_radius)
+        self.__mp_circle_specs = DrawingSpec(mp_circle_color,    mp_circle_thickness, mp_circle_radius)
 
         # opencv renderer
           # opencv text
@@ -29,6 +37,16 @@ class Renderer:
         self.__cv2_text_scale     = cv2_text_scale
         self.__cv2_text_color     = cv2_text_color
         self.__cv2_text_thickness = cv2_text_thickness
+          # opencv label glyphs, built on first use
+        self.__glyph_atlas = None
+        self.__label_stamp = None
+
+        # skeleton renderer, connection pairs and circle outline cached between frames
+        self.__connections = None
+        self.__circle_outlines = None
+
+        # compositor, scaled overlays are resized into a reused buffer
+        self.__overlay_buffer = None
 
   
     def __repr__(self):
@@ -37,13 +55,15 @@ class Renderer:
     def edit_mp_line(self,
     mp_line_color : Tuple[int, int, int] = (255, 0, 0),
     mp_line_thickness : int = 1):
-        self.__mp_line_specs = self.__mp_renderer.DrawingSpec(mp_line_color, mp_line_thickness)
+        self.__mp_line_specs = DrawingSpec(mp_line_color, mp_line_thickness)
+        self.__mp_specs = None
 
     def edit_mp_circle(self, 
     mp_circle_color : Tuple[int, int, int] = (0, 0, 255),
     mp_circle_thickness : int = 1,
     mp_circle_radius : int = 1):
-        self.__mp_circle_specs = self.__mp_renderer.DrawingSpec(mp_circle_color, mp_circle_thickness, mp_circle_radius)
+        self.__mp_circle_specs = DrawingSpec(mp_circle_color, mp_circle_thickness, mp_circle_radius)
+        self.__mp_specs = None
 
     def edit_cv2_text(self, cv2_text_font = cv2.FONT_HERSHEY_PLAIN,
     cv2_text_scale : float = 1.0,
@@ -53,15 +73,222 @@ class Renderer:
         self.__cv2_text_scale     = cv2_text_scale
         self.__cv2_text_color     = cv2_text_color
         self.__cv2_text_thickness = cv2_text_thickness
+        self.__glyph_atlas = None
+        self.__label_stamp = None
 
     def render_mp(self, main_image, landmarks, flags):
-        self.__mp_renderer.draw_landmarks(main_image, landmarks, flags,
-        self.__mp_line_specs, self.__mp_circle_specs)
+        if self.__mp_renderer is None:
+            import mediapipe as mp
+            self.__mp_renderer = mp.solutions.drawing_utils
+        if self.__mp_specs is None:
+            self.__mp_specs = tuple(self.__mp_renderer.DrawingSpec(specs.color, specs.thickness, specs.circle_radius)
+                for specs in (self.__mp_line_specs, self.__mp_circle_specs))
+        self.__mp_renderer.draw_landmarks(main_image, landmarks, flags, *self.__mp_specs)
+
+    # mediapipe style hand drawing from pixel landmarks, all hands in a few opencv calls
+    # details: (hands, 21, 2+) pixel landmarks as in HandDetect.get_details
+    # connections: landmark index pairs, e.g. HandDetect.HAND_CONNECTIONS
+    def render_skeleton(self, main_image, details, connections):
+        if self.__connections is None or self.__connections[0] is not connections:
+            self.__connections = (connections, np.array(sorted(connections), dtype = np.intp).reshape((-1, 2)))
+        pairs = self.__connections[1]
+
+        details = np.asarray(details)
+        if not details.size: return
+        height, width = main_image.shape[:2]
+        # same rule as drawing_utils, landmarks outside the image are not drawn
+        visible = ((details[..., 0] >= 0) & (details[..., 0] <= width) &
+                   (details[..., 1] >= 0) & (details[..., 1] <= height))
+        points = np.minimum(np.floor(details[..., :2]), (width - 1, height - 1)).astype(np.int32)
+
+        # every connection as a 2 point polyline, one call for all hands
+        segments = points[:, pairs].reshape((-1, 2, 2))
+        segments = segments[(visible[:, pairs[:, 0]] & visible[:, pairs[:, 1]]).ravel()]
+        if len(segments):
+            cv2.polylines(main_image, segments, False, self.__mp_line_specs.color, self.__mp_line_specs.thickness)
+
+        # joints as precomputed circle outlines, white border first like drawing_utils
+        joints = points[visible]
+        if not len(joints): return
+        radius = self.__mp_circle_specs.circle_radius
+        border_radius = max(radius + 1, int(radius * 1.2))
+        key = (radius, border_radius)
+        if self.__circle_outlines is None or self.__circle_outlines[0] != key:
+            self.__circle_outlines = (key,
+                np.array(cv2.ellipse2Poly((0, 0), (border_radius, border_radius), 0, 0, 360, 10), dtype = np.int32),
+                np.array(cv2.ellipse2Poly((0, 0), (radius, radius), 0, 0, 360, 10), dtype = np.int32))
+        _, border_outline, outline = self.__circle_outlines
+
+        thickness = self.__mp_circle_specs.thickness
+        for circle_radius, circle_outline, color in ((border_radius, border_outline, (224, 224, 224)),
+            (radius, outline, self.__mp_circle_specs.color)):
+            if thickness > 1:
+                # thick polylines cost more than plain circles, draw those one by one
+                for x, y in joints.tolist():
+                    cv2.circle(main_image, (x, y), circle_radius, color, thickness)
+                continue
+            circles = joints[:, None, :] + circle_outline[None, :, :]
+            if thickness < 0:
+                cv2.fillPoly(main_image, circles, color)
+            else:
+                cv2.polylines(main_image, circles, True, color, thickness)
 
     def render_cv2(self, main_image, text, position):
         cv2.putText(main_image, text, position, self.__cv2_text_font,
         self.__cv2_text_scale, self.__cv2_text_color, self.__cv2_text_thickness)
 
+    # pixels of every label glyph relative to the putText origin, rendered once per text setting
+    # coverage is kept as a weight so antialiased text blends like putText
+    def __build_glyph_atlas(self, label_count : int):
+        key = (self.__cv2_text_font, self.__cv2_text_scale, self.__cv2_text_color, self.__cv2_text_thickness, label_count)
+        if self.__glyph_atlas is not None and self.__glyph_atlas[0] == key:
+            return self.__glyph_atlas
+
+        pad = self.__cv2_text_thickness + 2
+        offsets_y, offsets_x, weights, counts = [], [], [], []
+        for label in range(label_count):
+            text = str(label)
+            (width, height), baseline = cv2.getTextSize(text, self.__cv2_text_font, self.__cv2_text_scale, self.__cv2_text_thickness)
+            glyph = np.zeros((height + baseline + 2 * pad, width + 2 * pad), dtype = np.uint8)
+            cv2.putText(glyph, text, (pad, pad + height), self.__cv2_text_font,
+                self.__cv2_text_scale, 255, self.__cv2_text_thickness)
+            glyph_y, glyph_x = np.nonzero(glyph)
+            offsets_y.append(glyph_y - (pad + height))
+            offsets_x.append(glyph_x - pad)
+            weights.append(glyph[glyph_y, glyph_x] / 255.0)
+            counts.append(len(glyph_y))
+
+        counts = np.array(counts)
+        self.__glyph_atlas = (key, np.concatenate(offsets_y), np.concatenate(offsets_x), np.concatenate(weights),
+            counts, np.cumsum(counts) - counts)
+        self.__label_stamp = None
+        return self.__glyph_atlas
+
+    # glyph pixels of a label sequence as (owner, offset y, offset x, weight), cached per sequence
+    def __stamp(self, labels, label_count : int):
+        _, offsets_y, offsets_x, weights, counts, starts = self.__build_glyph_atlas(label_count)
+        key = labels.tobytes()
+        if self.__label_stamp is not None and self.__label_stamp[0] == key:
+            return self.__label_stamp[1]
+
+        label_counts = counts[labels]
+        owner = np.repeat(np.arange(len(labels)), label_counts)
+        index = np.arange(len(owner)) - np.repeat(np.cumsum(label_counts) - label_counts, label_counts) + np.repeat(starts[labels], label_counts)
+        opaque = bool(np.all(weights[index] == 1.0))
+        stamp = (owner, offsets_y[index], offsets_x[index], None if opaque else weights[index][:, None].astype(np.float32))
+        self.__label_stamp = (key, stamp)
+        return stamp
+
+    # same output as render_cv2(main_image, str(label), position) for every position, overlapping labels included
+    # positions: (n, 2) putText origins, labels: glyph per position, position index modulo label_count if None
+    def render_cv2_labels(self, main_image, positions, labels = None, label_count : int = 21):
+        positions = np.asarray(positions, dtype = np.intp).reshape((-1, 2))
+        labels = np.arange(len(positions)) % label_count if labels is None else np.asarray(labels, dtype = np.intp)
+        owner, offsets_y, offsets_x, weights = self.__stamp(labels, label_count)
+
+        # flat pixel indices, per pixel clipping only when a label crosses the image border
+        height, width = main_image.shape[:2]
+        pixel_y = positions[owner, 1] + offsets_y
+        pixel_x = positions[owner, 0] + offsets_x
+        low, high = positions.min(axis = 0), positions.max(axis = 0)
+        if (low[1] + offsets_y.min() < 0 or high[1] + offsets_y.max() >= height or
+            low[0] + offsets_x.min() < 0 or high[0] + offsets_x.max() >= width):
+            visible = (pixel_y >= 0) & (pixel_y < height) & (pixel_x >= 0) & (pixel_x < width)
+            pixel_y, pixel_x = pixel_y[visible], pixel_x[visible]
+            weights = weights if weights is None else weights[visible]
+
+        # flat pixel indices need a contiguous image, reshaping a strided view (e.g. a crop) would
+        # return a copy and lose every write, so those are indexed by row and column instead
+        if main_image.flags.c_contiguous:
+            target, pixel_index = main_image.reshape((height * width, -1)), pixel_y * width + pixel_x
+        else:
+            target, pixel_index = main_image, (pixel_y, pixel_x)
+
+        if weights is None:
+            target[pixel_index] = self.__cv2_text_color
+            return
+
+        # a pixel under several labels is blended once per label in draw order, as repeated putText calls do
+        # layer n holds the n-th label covering each pixel, so every layer reads the result of the one before
+        color = np.array(self.__cv2_text_color, dtype = np.float32)
+        flat_index = pixel_y * width + pixel_x
+        order = np.argsort(flat_index, kind = "stable")
+        sorted_index = flat_index[order]
+        first = np.ones(len(order), dtype = bool)
+        np.not_equal(sorted_index[1:], sorted_index[:-1], out = first[1:])
+        if first.all():
+            pixels = target[pixel_index]
+            target[pixel_index] = np.rint(pixels + (color - pixels) * weights)
+            return
+
+        # entries grouped by layer, label order is kept inside each layer
+        sorted_positions = np.arange(len(order))
+        layer = np.empty(len(order), dtype = np.intp)
+        layer[order] = sorted_positions - np.maximum.accumulate(np.where(first, sorted_positions, 0))
+        by_layer = np.argsort(layer, kind = "stable")
+        bounds = np.cumsum(np.bincount(layer))
+        flat_index, pixel_y, pixel_x, weights = flat_index[by_layer], pixel_y[by_layer], pixel_x[by_layer], weights[by_layer]
+        start = 0
+        for end in bounds:
+            layer_index = flat_index[start:end] if main_image.flags.c_contiguous else (pixel_y[start:end], pixel_x[start:end])
+            pixels = target[layer_index]
+            target[layer_index] = np.rint(pixels + (color - pixels) * weights[start:end])
+            start = end
+
+    # alpha blends a bgra overlay onto the bgr main_image in place, only inside the overlay's visible bounds
+    # position: pixel the overlay center is placed at (e.g. a hand position), image center if None
+    # bounds: (x, y, w, h) of the visible overlay part if already known, found from the alpha channel otherwise
+    # returns the (x, y, w, h) region of main_image that was written, None if nothing was visible
+    def composite(self, main_image, overlay, position = None, scale : float = 1.0,
+        fixed_point : bool = True, bounds = None):
+
+        if scale != 1.0:
+            size = (max(1, int(round(overlay.shape[1] * scale))), max(1, int(round(overlay.shape[0] * scale))))
+            if self.__overlay_buffer is None or self.__overlay_buffer.shape[1::-1] != size:
+                self.__overlay_buffer = np.empty((size[1], size[0], 4), dtype = np.uint8)
+            overlay = cv2.resize(overlay, size, dst = self.__overlay_buffer, interpolation = cv2.INTER_LINEAR)
+            bounds = None if bounds is None else tuple(int(round(value * scale)) for value in bounds)
+
+        if bounds is None:
+            bounds = cv2.boundingRect(cv2.extractChannel(overlay, 3))
+        bx, by, bw, bh = bounds
+        if bw <= 0 or bh <= 0: return None
+
+        # overlay top left in main_image coordinates
+        image_height, image_width = main_image.shape[:2]
+        if position is None:
+            position = (image_width // 2, image_height // 2)
+        left = int(position[0]) - overlay.shape[1] // 2
+        top = int(position[1]) - overlay.shape[0] // 2
+
+        # visible bounds clipped to main_image
+        x0, y0 = max(left + bx, 0), max(top + by, 0)
+        x1, y1 = min(left + bx + bw, image_width), min(top + by + bh, image_height)
+        if x0 >= x1 or y0 >= y1: return None
+
+        background = main_image[y0:y1, x0:x1]
+        foreground = overlay[y0 - top:y1 - top, x0 - left:x1 - left]
+        blend_alpha(background, foreground, fixed_point)
+        return (x0, y0, x1 - x0, y1 - y0)
+
+# background (bgr) = foreground (bgr) * alpha + background * (1 - alpha), written in place
+def blend_alpha(background, foreground, fixed_point : bool = True):
+    alpha = foreground[..., 3:4]
+    if fixed_point:
+        # 8 bit weights, x / 255 as (t + (t >> 8)) >> 8 with t = x + 128, all within uint16
+        weight = alpha.astype(np.uint16)
+        blended = foreground[..., :3] * weight
+        blended += background * (255 - weight)
+        blended += 128
+        blended += blended >> 8
+        blended >>= 8
+        background[...] = blended
+    else:
+        weight = alpha * np.float32(1.0 / 255.0)
+        blended = background + (foreground[..., :3] - background.astype(np.float32)) * weight
+        np.rint(blended, out = blended)
+        background[...] = blended
+
 if __name__ == "__main__":
     import HandDetect as hd
   
@@ -79,7 +306,8 @@ if __name__ == "__main__":
         success = hand_detector(main_image_rgb, image_height, image_width)
         if not success: continue
   
-        hand_detector.render(main_image, renderer.render_mp, renderer.render_cv2)
+        hand_detector.render(main_image, renderer.render_mp, renderer.render_cv2,
+            render_fn_labels = renderer.render_cv2_labels, render_fn_skeleton = renderer.render_skeleton)
   
         cv2.imshow("Hand Detector Output", main_image)
   
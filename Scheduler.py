@@ -0,0 +1,300 @@
+from enum import Enum
+import time
+
+import cv2
+import numpy as np
+
+import HandData as hdata
+import HandDetect as hd
+
+# how landmarks are filled in on frames the detector skips
+class Prediction(Enum):
+    VELOCITY     = 0
+    OPTICAL_FLOW = 1
+
+# mediapipe landmark lists of predicted landmarks, only built when something iterates them (e.g. render_mp)
+# details: (hands, 21, 3) pixel landmarks, detected: the detector's lists, whose type is reused but never edited
+class PredictedLandmarks:
+    def __init__(self, details, width : int, height : int, detected):
+        self.__details = details
+        self.__width = width
+        self.__height = height
+        self.__detected = detected
+        self.__lists = None
+
+    def __built(self):
+        if self.__lists is None:
+            self.__lists = []
+            for hand_index, details in enumerate(self.__details.tolist()):
+                landmarks = type(self.__detected[hand_index])()
+                for x, y, z in details:
+                    landmarks.landmark.add(x = x / self.__width, y = y / self.__height, z = z)
+                self.__lists.append(landmarks)
+        return self.__lists
+
+    def __len__(self):
+        return len(self.__details)
+
+    def __getitem__(self, index):
+        return self.__built()[index]
+
+    def __iter__(self):
+        return iter(self.__built())
+
+# runs HandDetect every interval frames and predicts the landmarks in between
+# the interval adapts to the measured hand speed and to the time budget of target_fps
+class DetectScheduler:
+    def __init__(self, hand_detector, prediction : Prediction = Prediction.VELOCITY,
+        min_interval : int = 1, max_interval : int = 4,
+        target_fps : float = 30.0,
+        slow_speed : float = 4.0, fast_speed : float = 40.0,
+        move_threshold : float = 2.0, move_z_threshold : float = 0.00001):
+
+        # scheduling details
+        # slow_speed / fast_speed: hand speed in pixels per frame mapped to max_interval / min_interval
+        self.__hand_detector = hand_detector
+        self.__prediction = prediction
+        self.__min_interval = max(1, min_interval)
+        self.__max_interval = max(self.__min_interval, max_interval)
+        self.__target_fps = target_fps
+        self.__slow_speed = slow_speed
+        self.__fast_speed = fast_speed
+        self.__interval = self.__min_interval
+        self.__countdown = 0
+        self.__predicted = False
+
+        # frame size of the last prediction, mediapipe lists of it are only built on request
+        self.__frame_size = (1, 1)
+
+        # running averages of the time spent per detected and per predicted frame
+        self.__detect_time = 0.0
+        self.__predict_time = 0.0
+
+        # landmark state, same layout as HandDetect.get_details
+        max_num_hands = hand_detector.max_num_hands
+        self.__hand_count = 0
+        self.__landmarks = np.zeros((max_num_hands, hd.HAND_LANDMARKS, 3), dtype = np.float64)
+        self.__detected_landmarks = np.zeros((max_num_hands, hd.HAND_LANDMARKS, 3), dtype = np.float64)
+        self.__velocity = np.zeros((max_num_hands, hd.HAND_LANDMARKS, 3), dtype = np.float64)
+        self.__frames_since_detect = 0
+
+        # hand movement between detections, as HandData.movement() measures it
+        self.__centroids = np.zeros((max_num_hands, 3), dtype = np.float64)
+        self.__prev_centroids = np.zeros((max_num_hands, 3), dtype = np.float64)
+        self.__move_thresholds = np.array([move_threshold, move_threshold, move_z_threshold], dtype = float)
+        self.__delta = np.zeros((max_num_hands, 3), dtype = np.float64)
+        self.__directions = np.zeros((max_num_hands, len(hdata.Directions)), dtype = bool)
+        self.__speed = 0.0
+
+        # optical flow buffers, grayscale frames are swapped instead of reallocated
+        self.__gray = None
+        self.__prev_gray = None
+        self.__points = np.zeros((max_num_hands * hd.HAND_LANDMARKS, 1, 2), dtype = np.float32)
+        self.__flow_points = np.zeros((max_num_hands * hd.HAND_LANDMARKS, 1, 2), dtype = np.float32)
+
+    def __call__(self, main_image_rgb, height : int, width : int) -> bool:
+        return self.__step(main_image_rgb, cv2.COLOR_RGB2GRAY,
+            lambda: self.__hand_detector(main_image_rgb, height, width))
+
+    # same as HandDetect.detect, main_image is the camera frame
+    def detect(self, main_image, code = cv2.COLOR_BGR2RGB, gray_code = cv2.COLOR_BGR2GRAY) -> bool:
+        return self.__step(main_image, gray_code,
+            lambda: self.__hand_detector.detect(main_image, code))
+
+    def __step(self, image, gray_code, detect_fn) -> bool:
+        start = time.perf_counter()
+
+        if self.__prediction == Prediction.OPTICAL_FLOW:
+            self.__prev_gray, self.__gray = self.__gray, self.__prev_gray
+            if self.__gray is None or self.__gray.shape != image.shape[:2]:
+                self.__gray = np.empty(image.shape[:2], dtype = np.uint8)
+            cv2.cvtColor(image, gray_code, dst = self.__gray)
+
+        self.__countdown -= 1
+        if self.__countdown <= 0:
+            self.__predicted = False
+            success = self.__detected(detect_fn())
+            self.__detect_time = self.__average(self.__detect_time, time.perf_counter() - start)
+            self.__schedule()
+            return success
+
+        # no hands to predict from until the next detection
+        if not self.__hand_count:
+            self.__predicted = False
+            return False
+
+        self.__predicted = True
+        self.__predict(image.shape[1], image.shape[0])
+        self.__predict_time = self.__average(self.__predict_time, time.perf_counter() - start)
+        return True
+
+    @staticmethod
+    def __average(average : float, sample : float) -> float:
+        return sample if average == 0.0 else 0.9 * average + 0.1 * sample
+
+    def __detected(self, success : bool) -> bool:
+        hand_count = self.__hand_detector.hand_count if success else 0
+        details = self.__hand_detector.get_details
+
+        # landmark velocity per frame, only meaningful when the same hands are seen again
+        frames = self.__frames_since_detect + 1
+        if hand_count and hand_count == self.__hand_count:
+            np.subtract(details, self.__detected_landmarks[:hand_count], out = self.__velocity[:hand_count])
+            self.__velocity[:hand_count] /= frames
+            self.__prev_centroids[:hand_count] = self.__centroids[:hand_count]
+            hdata.centroid(details, self.__centroids[:hand_count])
+            hdata.movement(self.__centroids[:hand_count], self.__prev_centroids[:hand_count],
+                self.__move_thresholds, self.__delta[:hand_count], self.__directions[:hand_count])
+            self.__speed = float(np.hypot(self.__delta[:hand_count, 0], self.__delta[:hand_count, 1]).max()) / frames
+        else:
+            self.__velocity[:] = 0.0
+            self.__directions[:] = False
+            self.__speed = 0.0
+            if hand_count:
+                hdata.centroid(details, self.__centroids[:hand_count])
+
+        self.__hand_count = hand_count
+        self.__landmarks[:hand_count] = details
+        self.__detected_landmarks[:hand_count] = details
+        self.__frames_since_detect = 0
+        return success
+
+    # frames between detections, the budget limit wins over the speed limit
+    def __schedule(self):
+        if not self.__hand_count:
+            interval = self.__min_interval
+        else:
+            span = max(self.__fast_speed - self.__slow_speed, 1e-9)
+            fast = min(max((self.__speed - self.__slow_speed) / span, 0.0), 1.0)
+            interval = int(round(self.__max_interval - fast * (self.__max_interval - self.__min_interval)))
+
+        # average frame time (detect + (n - 1) predict) / n has to fit the frame budget
+        budget = 1.0 / self.__target_fps if self.__target_fps > 0 else 0.0
+        if budget > 0.0 and self.__detect_time > budget:
+            if self.__predict_time >= budget:
+                interval = self.__max_interval
+            else:
+                interval = max(interval, int(np.ceil((self.__detect_time - self.__predict_time) / (budget - self.__predict_time))))
+
+        self.__interval = min(max(interval, self.__min_interval), self.__max_interval)
+        self.__countdown = self.__interval
+
+    def __predict(self, width : int, height : int):
+        self.__frames_since_detect += 1
+        hand_count = self.__hand_count
+        landmarks = self.__landmarks[:hand_count]
+
+        if self.__prediction == Prediction.OPTICAL_FLOW and self.__prev_gray is not None:
+            count = hand_count * hd.HAND_LANDMARKS
+            points = self.__points[:count]
+            points[:, 0] = landmarks[..., :2].reshape((-1, 2))
+            flow_points, status, _ = cv2.calcOpticalFlowPyrLK(self.__prev_gray, self.__gray, points, self.__flow_points[:count])
+            tracked = status.reshape((hand_count, hd.HAND_LANDMARKS)).astype(bool)
+
+            # points lost by the flow keep moving at the detected velocity
+            landmarks += self.__velocity[:hand_count]
+            landmarks[..., :2][tracked] = flow_points.reshape((hand_count, hd.HAND_LANDMARKS, 2))[tracked]
+        else:
+            landmarks += self.__velocity[:hand_count]
+
+        np.clip(landmarks[..., 0], 0, width - 1, out = landmarks[..., 0])
+        np.clip(landmarks[..., 1], 0, height - 1, out = landmarks[..., 1])
+        self.__frame_size = (width, height)
+
+    def render(self, main_image, render_fn_hand = None, render_fn_details = None,
+        render_fn_labels = None, render_fn_skeleton = None):
+        self.__hand_detector.render(main_image, render_fn_hand, render_fn_details, self.snapshot(copy = False),
+            render_fn_labels, render_fn_skeleton)
+
+    # same as HandDetect.snapshot, landmarks are PredictedLandmarks of the predicted details on predicted frames
+    def snapshot(self, copy : bool = True):
+        if not self.__hand_count:
+            return [], self.__landmarks[:0]
+        details = self.__landmarks[:self.__hand_count].copy() if copy else self.get_details
+        if self.__predicted:
+            hand_landmarks, _ = self.__hand_detector.snapshot(copy = False)
+            return PredictedLandmarks(details, *self.__frame_size, hand_landmarks), details
+        hand_landmarks, _ = self.__hand_detector.snapshot(copy)
+        return hand_landmarks[:self.__hand_count], details
+
+    # read only (hand count, 21, 3) view, detected or predicted
+    @property
+    def get_details(self):
+        details = self.__landmarks[:self.__hand_count]
+        details.flags.writeable = False
+        return details
+
+    @property
+    def get_details_list(self):
+        return hd.details_to_list(self.get_details)
+
+    # handedness and scores of the last detection
+    @property
+    def get_handedness(self):
+        return self.__hand_detector.get_handedness[:self.__hand_count]
+
+    @property
+    def get_scores(self):
+        return self.__hand_detector.get_scores[:self.__hand_count]
+
+    @property
+    def hand_count(self):
+        return self.__hand_count
+
+    @property
+    def max_num_hands(self):
+        return self.__hand_detector.max_num_hands
+
+    # True when the current landmarks were predicted instead of detected
+    @property
+    def predicted(self):
+        return self.__predicted
+
+    @property
+    def interval(self):
+        return self.__interval
+
+    # hand speed between the last two detections, pixels per frame
+    @property
+    def speed(self):
+        return self.__speed
+
+    @property
+    def directions_mask(self):
+        return self.__directions[:self.__hand_count]
+
+    @property
+    def detect_time(self):
+        return self.__detect_time
+
+    @property
+    def predict_time(self):
+        return self.__predict_time
+
+    @property
+    def hand_detector(self):
+        return self.__hand_detector
+
+if __name__ == "__main__":
+    import Camera as cam
+    import Renderer as rdr
+
+    camera_object = cam.Camera(camera_index = 1)
+    scheduler = DetectScheduler(hd.HandDetect(), Prediction.OPTICAL_FLOW, max_interval = 4, target_fps = 30.0)
+    renderer = rdr.Renderer()
+    camera_object.start_capture()
+
+    while True:
+        if not camera_object.capture(): break
+
+        success = scheduler.detect(camera_object.frame())
+        if success:
+            scheduler.render(camera_object.frame(), render_fn_labels = renderer.render_cv2_labels,
+                render_fn_skeleton = renderer.render_skeleton)
+        renderer.render_cv2(camera_object.frame(), "Predicted" if scheduler.predicted else "Detected", (10, 30))
+
+        camera_object.display_image()
+
+        key = cv2.waitKey(1) & 0xFF
+        if key == 27: break
+        elif key == ord("q"): print("Interval: %d, Speed: %5.2f" % (scheduler.interval, scheduler.speed))
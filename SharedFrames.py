@@ -0,0 +1,198 @@
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import cv2
+import numpy as np
+
+import HandDetect as hd
+
+# fixed slots of frames in one shared memory block, other processes attach to it by name
+# slots are handed out and returned by the creating process, other processes only get slot indices
+class SharedFramePool:
+    def __init__(self, shape, slot_count : int = 4, dtype = np.uint8, name : str = None):
+
+        # pool details
+        self.__shape = tuple(shape)
+        self.__slot_count = slot_count
+        self.__dtype = np.dtype(dtype)
+        self.__owner = name is None
+        self.__name = name
+        self.__memory = None
+        self.__frames = None
+
+        # attached pools map the block on first use, after an unpickling worker process has fully started
+        if self.__owner:
+            size = slot_count * int(np.prod(self.__shape)) * self.__dtype.itemsize
+            self.__memory = shared_memory.SharedMemory(create = True, size = size)
+            self.__name = self.__memory.name
+            self.__map()
+
+        # allocator, only used by the owner
+        self.__free = list(range(slot_count - 1, -1, -1))
+        self.__condition = threading.Condition()
+
+    # pickled as a reference to the same block, so pools can be passed to worker processes
+    def __reduce__(self):
+        return (SharedFramePool, (self.__shape, self.__slot_count, self.__dtype.str, self.__name))
+
+    def __map(self):
+        if self.__memory is None:
+            self.__memory = _attach(self.__name)
+        self.__frames = np.ndarray((self.__slot_count,) + self.__shape, dtype = self.__dtype,
+            buffer = self.__memory.buf)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def shape(self):
+        return self.__shape
+
+    @property
+    def slot_count(self):
+        return self.__slot_count
+
+    @property
+    def free_count(self):
+        return len(self.__free)
+
+    # (index, frame view) of a free slot, None when none frees up within timeout
+    def acquire(self, timeout : float = None):
+        with self.__condition:
+            if not self.__condition.wait_for(lambda: self.__free, timeout):
+                return None
+            index = self.__free.pop()
+            return index, self.frame(index)
+
+    def release(self, index : int):
+        with self.__condition:
+            self.__free.append(index)
+            self.__condition.notify()
+
+    # view of a slot, no copy
+    def frame(self, index : int):
+        if self.__frames is None:
+            self.__map()
+        return self.__frames[index]
+
+    # the owner also removes the block, views of it must not be used afterwards
+    def close(self):
+        self.__frames = None
+        if self.__memory is None: return
+        self.__memory.close()
+        if self.__owner:
+            self.__memory.unlink()
+        self.__memory = None
+
+def _attach(name : str):
+    try:
+        return shared_memory.SharedMemory(name = name, track = False)
+    except TypeError:
+        # before python 3.13 attaching registers the block again, and the tracker would remove it on exit
+        # children started by multiprocessing share the tracker of the owner, where registering twice is harmless
+        memory = shared_memory.SharedMemory(name = name)
+        if multiprocessing.parent_process() is None:
+            resource_tracker.unregister(memory._name, "shared_memory")
+        return memory
+
+# detection process reading frames from a pool by index, only the landmark arrays come back
+def _detect_worker(pool, detector_kwargs, code, input_queue, output_queue):
+    hand_detector = hd.HandDetect(**detector_kwargs)
+    frame_rgb = None
+
+    while True:
+        item = input_queue.get()
+        if item is None: break
+
+        frame = pool.frame(item)
+        if code is not None:
+            frame_rgb = cv2.cvtColor(frame, code,
+                dst = frame_rgb if frame_rgb is not None and frame_rgb.shape[:2] == frame.shape[:2] else None)
+        else:
+            frame_rgb = frame
+        success = hand_detector(frame_rgb, frame.shape[0], frame.shape[1])
+        output_queue.put((item, success, hand_detector.get_details.copy(),
+            hand_detector.get_handedness.copy(), hand_detector.get_scores.copy()))
+    pool.close()
+
+# seconds between liveness checks of the detection process while waiting on its queues
+POLL_INTERVAL = 0.1
+
+# HandDetect running in its own process on the frames of a SharedFramePool
+# submit() sends a slot index, result() returns (index, success, details, handedness, scores)
+# both raise RuntimeError once the process died instead of waiting forever
+class SharedDetector:
+    def __init__(self, pool : SharedFramePool, detector_kwargs : dict = None, code = cv2.COLOR_BGR2RGB,
+        queue_size : int = 2):
+
+        context = multiprocessing.get_context("spawn")
+        self.__input_queue = context.Queue(queue_size)
+        self.__output_queue = context.Queue(queue_size)
+        self.__process = context.Process(target = _detect_worker, args = (pool, detector_kwargs or {}, code,
+            self.__input_queue, self.__output_queue), daemon = True)
+        self.__process.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def alive(self):
+        return self.__process is not None and self.__process.is_alive()
+
+    def __check_alive(self):
+        if not self.alive:
+            raise RuntimeError("detection process exited (code %s)" %
+                (self.__process.exitcode if self.__process is not None else "closed"))
+
+    # slot must not be written or released before its result came back
+    def submit(self, index : int):
+        while True:
+            self.__check_alive()
+            try:
+                self.__input_queue.put(index, timeout = POLL_INTERVAL)
+                return
+            except queue.Full:
+                pass
+
+    # timeout: seconds, raises TimeoutError when no result came back in time
+    def result(self, timeout : float = None):
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            try:
+                return self.__output_queue.get(timeout = POLL_INTERVAL if deadline is None
+                    else max(0.0, min(POLL_INTERVAL, deadline - time.perf_counter())))
+            except queue.Empty:
+                self.__check_alive()
+                if deadline is not None and time.perf_counter() >= deadline:
+                    raise TimeoutError("no detection result within %g s" % timeout)
+
+    def __call__(self, index : int, timeout : float = None):
+        self.submit(index)
+        return self.result(timeout)
+
+    # a dead or stuck process is killed instead of joined forever
+    def close(self, timeout : float = 5.0):
+        if self.__process is None: return
+        if self.__process.is_alive():
+            try:
+                self.__input_queue.put(None, timeout = timeout)
+            except queue.Full:
+                pass
+            self.__process.join(timeout)
+        if self.__process.is_alive():
+            self.__process.kill()
+            self.__process.join()
+        self.__process = None
@@ -0,0 +1,85 @@
+import numpy as np
+
+# 4x4 homogeneous matrices, written into out when given so callers can keep reusing their buffers
+
+def identity_matrix(out = None):
+    if out is None:
+        return np.identity(4)
+    out[...] = 0.0
+    out[[0, 1, 2, 3], [0, 1, 2, 3]] = 1.0
+    return out
+
+def scale_matrix(scale_vec, out = None):
+    out = identity_matrix(out)
+    out[[0, 1, 2], [0, 1, 2]] = scale_vec[:3]
+    return out
+
+# rotation of angle (radians) around axis, rodrigues formula
+def rotation_matrix(axis, angle : float, out = None):
+    out = identity_matrix(out)
+    axis = np.asarray(axis, dtype = float)
+    length = np.linalg.norm(axis)
+    if length == 0.0: return out
+
+    x, y, z = axis / length
+    cos, sin = np.cos(angle), np.sin(angle)
+    cross = np.array([[ 0.0,  -z,   y ],
+                      [  z,  0.0,  -x ],
+                      [ -y,    x, 0.0 ]])
+    out[:3, :3] = cos * np.identity(3) + sin * cross + (1.0 - cos) * np.outer((x, y, z), (x, y, z))
+    return out
+
+# rotation from a (w, x, y, z) quaternion, normalized first
+def quaternion_matrix(quaternion, out = None):
+    out = identity_matrix(out)
+    quaternion = np.asarray(quaternion, dtype = float)
+    length = np.linalg.norm(quaternion)
+    if length == 0.0: return out
+
+    w, x, y, z = quaternion / length
+    out[:3, :3] = [[1.0 - 2.0 * (y * y + z * z), 2.0 * (x * y - z * w),       2.0 * (x * z + y * w)      ],
+                   [2.0 * (x * y + z * w),       1.0 - 2.0 * (x * x + z * z), 2.0 * (y * z - x * w)      ],
+                   [2.0 * (x * z - y * w),       2.0 * (y * z + x * w),       1.0 - 2.0 * (x * x + y * y)]]
+    return out
+
+def translation_matrix(translate_vec, out = None):
+    out = identity_matrix(out)
+    out[:3, 3] = translate_vec[:3]
+    return out
+
+# orthographic projection onto the plane through the origin with the given normal
+# arguments are validated before out is touched, so a rejected call leaves out unchanged
+def orthographic_matrix(normal, out = None):
+    normal = np.asarray(normal, dtype = float)
+    length = np.linalg.norm(normal)
+    if length == 0.0:
+        raise ValueError("orthographic projection needs a non zero plane normal")
+
+    out = identity_matrix(out)
+    normal = normal / length
+    out[:3, :3] -= np.outer(normal, normal)
+    return out
+
+# parallel (oblique) projection onto the z = 0 plane along direction
+def parallel_matrix(direction, out = None):
+    if direction[2] == 0.0:
+        raise ValueError("parallel projection direction must not lie in the z = 0 plane")
+
+    out = identity_matrix(out)
+    out[0, 2] = -direction[0] / direction[2]
+    out[1, 2] = -direction[1] / direction[2]
+    out[2, 2] = 0.0
+    return out
+
+# shear with factors (x by y, y by z, z by x)
+def skew_matrix(factors, out = None):
+    out = identity_matrix(out)
+    out[0, 1] = factors[0]
+    out[1, 2] = factors[1]
+    out[2, 0] = factors[2]
+    return out
+
+# points: (4, n) homogeneous columns, result written into out (4, n)
+def transform_points(matrix, points, out):
+    np.matmul(matrix, points, out = out)
+    return out
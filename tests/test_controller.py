@@ -0,0 +1,35 @@
+import numpy as np
+
+import Controller as ctl
+import Graph as gr
+import Transform as tf
+
+OPEN_HAND = ctl.ALL_FINGERS
+INDEX = ctl.finger_bits(ctl.hdata.HandIndices.INDEX)
+INDEX_MIDDLE = ctl.finger_bits(ctl.hdata.HandIndices.INDEX, ctl.hdata.HandIndices.MIDDLE)
+
+# model matrix the graph should hold for the transform the controller reports as applied
+def expected_model(controller):
+    pitch, yaw = controller.angles / 2.0
+    quaternion = (np.cos(yaw) * np.cos(pitch), np.cos(yaw) * np.sin(pitch),
+        np.sin(yaw) * np.cos(pitch), -np.sin(yaw) * np.sin(pitch))
+    return tf.translation_matrix(controller.translation) @ tf.quaternion_matrix(quaternion) \
+        @ tf.scale_matrix(controller.scale_factors)
+
+def test_graph_follows_controller_after_mixed_gestures():
+    graph = gr.Graph(graph_type = gr.GraphType.SURFACE, backend = gr.GraphBackend.OPENCV)
+    controller = ctl.TransformController(graph)
+
+    # translate, then rotate for a long time, then scale, then alternate
+    sequence = [(OPEN_HAND, (5.0, -3.0))] * 30 + [(INDEX, (2.0, 1.0))] * 200 + \
+        [(INDEX_MIDDLE, (0.0, -4.0))] * 30 + [(OPEN_HAND, (-2.0, 1.0)), (INDEX, (1.0, 3.0))] * 50 + \
+        [(OPEN_HAND, (0.0, 0.0))] * 150
+    position = np.zeros(3)
+    timestamp = 0.0
+    for finger_bits, (dx, dy) in sequence:
+        position[:2] += (dx, dy)
+        timestamp += 1.0 / 30.0
+        controller.update_state(finger_bits, 0, position, timestamp)
+
+    np.testing.assert_allclose(graph.model_matrix(), expected_model(controller), atol = 1e-12)
+    np.testing.assert_allclose(controller.translation, controller.target[ctl.TRANSLATION], atol = 1e-3)
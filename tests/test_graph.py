@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+import Graph as gr
+
+def rotated(graph, angle):
+    graph.rotate(np.array([1.0, 0.0, 0.0]), angle)
+    graph.translate(np.array([0.5, -0.5, 0.0]))
+
+# a graph built in a state and one moved there by in place updates show the same pixels
+@pytest.mark.parametrize("graph_type", [gr.GraphType.LINE, gr.GraphType.WIREFRAME, gr.GraphType.SURFACE])
+def test_fresh_and_incremental_render_match(graph_type):
+    incremental = gr.Graph(graph_type = graph_type)
+    incremental.render_to_image()
+    for angle in (0.3, 0.6, 0.0, 0.6):
+        rotated(incremental, angle)
+        fresh = gr.Graph(graph_type = graph_type)
+        rotated(fresh, angle)
+        np.testing.assert_array_equal(incremental.render_to_image(), fresh.render_to_image())
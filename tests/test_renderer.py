@@ -0,0 +1,37 @@
+import cv2
+import numpy as np
+import pytest
+
+import Renderer as rdr
+
+TEXT_SETTINGS = [{}, { "cv2_text_font" : cv2.FONT_HERSHEY_SIMPLEX, "cv2_text_scale" : 0.6, "cv2_text_thickness" : 2 }]
+
+POSITIONS = {
+    "isolated"    : [[20, 30], [80, 30], [20, 90], [80, 90]],
+    "border"      : [[-4, 6], [150, 118], [70, 2], [155, 60]],
+    "overlapping" : [[30, 40], [34, 40], [36, 43], [32, 38], [100, 80]] }
+
+def sequential(renderer, image, positions):
+    for label, position in enumerate(positions):
+        renderer.render_cv2(image, str(label), tuple(position))
+
+@pytest.mark.parametrize("settings", TEXT_SETTINGS)
+@pytest.mark.parametrize("case", POSITIONS)
+def test_labels_match_put_text(settings, case):
+    renderer = rdr.Renderer(**settings)
+    image = np.random.default_rng(0).integers(0, 256, (120, 160, 3), dtype = np.uint8)
+    expected = image.copy()
+    sequential(renderer, expected, POSITIONS[case])
+
+    renderer.render_cv2_labels(image, POSITIONS[case])
+    np.testing.assert_array_equal(image, expected)
+
+@pytest.mark.parametrize("settings", TEXT_SETTINGS)
+def test_labels_match_put_text_on_crop(settings):
+    renderer = rdr.Renderer(**settings)
+    image = np.random.default_rng(1).integers(0, 256, (140, 180, 3), dtype = np.uint8)
+    expected = image.copy()
+    sequential(renderer, expected[10:130, 10:170], POSITIONS["overlapping"])
+
+    renderer.render_cv2_labels(image[10:130, 10:170], POSITIONS["overlapping"])
+    np.testing.assert_array_equal(image, expected)